@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from formula import fitting_diagnostics
+from tracer import GUARD_NAMES
+import settings
+
+@dataclass(frozen=True)
+class FitAnalytics:
+    """Residual and coefficient analytics of one fit."""
+    # One row per fitted point (the three copied prices are left out)
+    points: pd.DataFrame
+    windows: tuple
+    rmse: float
+    mae: float
+    # Plain mean APE of the fitted points; not the running mean of `determine_MAPE_list`
+    mape: float
+    direction_accuracy: float
+    branch_counts: dict
+    guard_rates: dict
+
+    def summary_frame(self):
+        """Metric/value table of the whole-fit figures."""
+        rows = [('RMSE', self.rmse), ('MAE', self.mae), ('MAPE per Point (%)', self.mape),
+                ('Direction Accuracy (%)', self.direction_accuracy)]
+        rows += [(f"Branch {branch}", count) for branch, count in self.branch_counts.items()]
+        rows += [(f"Guard {name} (%)", rate * 100) for name, rate in self.guard_rates.items()]
+        return pd.DataFrame(rows, columns=['Metric', 'Value'])
+
+def _rolling_sums(stacked, window):
+    """Trailing `window` sums of each row of `stacked`; NaN until the window is full."""
+    sums = np.full(stacked.shape, np.nan)
+    if window <= stacked.shape[1]:
+        totals = np.concatenate([np.zeros((len(stacked), 1)), np.cumsum(stacked, axis=1)], axis=1)
+        sums[:, window - 1:] = totals[:, window:] - totals[:, :-window]
+    return sums
+
+def fit_analytics(fitting_dates, fitting_prices, Fitting_S_n_list, v_list=None, windows=None):
+    """
+    Residuals, rolling RMSE/MAE/MAPE, branch usage, guard-hit rates and
+    direction-of-move accuracy of a fit, computed on whole arrays.
+
+    A move counts as a hit when the fitted value lies on the same side of
+    the previous actual price as the actual price; unchanged prices are
+    not counted. Branches and guards come from the vectorized step, which
+    takes the same branch as `fitting`. Returns None for fewer than 4 points.
+    """
+    windows = tuple(windows or settings.ANALYTICS_WINDOWS)
+    prices = np.asarray(fitting_prices, dtype=float)
+    n = min(len(prices), len(Fitting_S_n_list))
+    if n < 4:
+        return None
+    actual = prices[3:n]
+    fitted = np.asarray(Fitting_S_n_list[3:n], dtype=float)
+    previous = prices[2:n - 1]
+
+    residual = fitted - actual
+    abs_error = np.abs(residual)
+    valid = actual != 0
+    ape = np.divide(abs_error, np.abs(actual), out=np.full_like(abs_error, np.nan), where=valid) * 100
+    actual_move = np.sign(actual - previous)
+    moved = actual_move != 0
+    direction_hit = np.sign(fitted - previous) == actual_move
+
+    velocity = np.diff(prices[:n]) if v_list is None else np.asarray(v_list, dtype=float)
+    branches, guards = fitting_diagnostics(prices[:n])
+    branches, guards = branches[3:], guards[3:]
+
+    points = pd.DataFrame({
+        'Date': list(fitting_dates[3:n]),
+        'Actual': actual,
+        'Fitted': fitted,
+        'Residual': residual,
+        'Abs Error': abs_error,
+        'APE (%)': ape,
+        'Velocity': velocity[2:n - 1],
+        'Direction Hit': np.where(moved, direction_hit, np.nan),
+        'Branch': branches,
+        'Guards': guards,
+    })
+
+    # One cumulative sum serves every window
+    stacked = np.vstack([abs_error, residual ** 2, np.where(valid, ape, 0.0), valid])
+    for window in windows:
+        sums = _rolling_sums(stacked, window)
+        points[f'RMSE ({window})'] = np.sqrt(np.maximum(sums[1], 0) / window)
+        points[f'MAE ({window})'] = sums[0] / window
+        with np.errstate(invalid='ignore', divide='ignore'):
+            points[f'MAPE ({window}) (%)'] = np.where(sums[3] > 0, sums[2] / sums[3], np.nan)
+
+    branch_values, branch_totals = np.unique(branches, return_counts=True)
+    return FitAnalytics(
+        points=points,
+        windows=windows,
+        rmse=float(np.sqrt(np.mean(residual ** 2))),
+        mae=float(np.mean(abs_error)),
+        mape=float(np.nanmean(ape)) if valid.any() else float('nan'),
+        direction_accuracy=float(np.mean(direction_hit[moved]) * 100) if moved.any() else float('nan'),
+        branch_counts=dict(zip(branch_values.tolist(), branch_totals.tolist())),
+        guard_rates={name: float(np.mean(guards & bit != 0)) for bit, name in GUARD_NAMES.items()},
+    )
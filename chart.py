@@ -1,99 +1,466 @@
+import threading
+from collections import OrderedDict
 import streamlit as st
-import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch
+import altair as alt
 import numpy as np
 import pandas as pd
 from table import display_fitting_table, display_fitting_forecast_table, display_mape_table
+import settings
 
-def plot_fitting(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list):
+def minmax_indices(values, max_points):
+    """
+    Indices of a min/max decimation of `values` to about `max_points` points.
+
+    The series is cut into `max_points / 2` equal buckets and the lowest and
+    highest point of each bucket are kept, so peaks and troughs survive.
+    """
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    size = -(-n // max(max_points // 2, 1))
+    buckets = -(-n // size)
+    lows = np.full(buckets * size, np.inf)
+    highs = np.full(buckets * size, -np.inf)
+    lows[:n] = values
+    highs[:n] = values
+    offsets = np.arange(buckets) * size
+    keep = np.concatenate([lows.reshape(buckets, size).argmin(axis=1) + offsets,
+                           highs.reshape(buckets, size).argmax(axis=1) + offsets, [0, n - 1]])
+    return np.unique(keep)
+
+def chart_x(values):
+    """
+    Chart x values for `values`: wall-clock epoch milliseconds for dates,
+    floats otherwise. Returns the array and whether it is temporal.
+    """
+    index = pd.Index(values)
+    if isinstance(index, pd.DatetimeIndex):
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        return index.values.astype('datetime64[ms]').astype(np.int64), True
+    return np.asarray(values, dtype=float), False
+
+def _window_bounds(x, window):
+    """Slice bounds of sorted `x` covering `window`, plus one point either side."""
+    if window is None:
+        return 0, len(x)
+    start = max(int(np.searchsorted(x, window[0], side='left')) - 1, 0)
+    stop = min(int(np.searchsorted(x, window[1], side='right')) + 1, len(x))
+    return start, stop
+
+def _window_frame(series, window, max_points):
+    """Long-format frame of each series inside `window`, decimated to its share of `max_points`."""
+    budget = max(max_points // max(len(series), 1), 2)
+    frames = []
+    for name, x, y, _ in series:
+        start, stop = _window_bounds(x, window)
+        keep = start + minmax_indices(y[start:stop], budget)
+        frames.append(pd.DataFrame({'x': x[keep], 'value': y[keep], 'series': name}))
+    return pd.concat(frames, ignore_index=True)
+
+def _band_frame(bands, window, max_points):
+    frames = []
+    for name, x, low, high, _ in bands:
+        start, stop = _window_bounds(x, window)
+        step = max(-(-(stop - start) // max_points), 1)
+        frames.append(pd.DataFrame({'x': x[start:stop:step], 'low': low[start:stop:step],
+                                    'high': high[start:stop:step], 'band': name}))
+    return pd.concat(frames, ignore_index=True)
+
+def _selected_window(event, temporal):
+    """(start, end) of the brushed range in chart x units, or None."""
+    bounds = (event.selection.get("window") or {}).get("x")
+    if not bounds or len(bounds) != 2:
+        return None
+    if temporal and isinstance(bounds[0], str):
+        # The x scale is UTC, so the ISO strings are the wall-clock times
+        stamps = [pd.Timestamp(b) for b in bounds]
+        bounds = [(t.tz_convert(None) if t.tz is not None else t).value // 10**6 for t in stamps]
+    return min(bounds), max(bounds)
+
+@st.fragment
+def windowed_chart(key, title, series, temporal, bands=(), marker=None, x_title="Tanggal", y_title="Harga",
+                   max_points=None):
+    """
+    Interactive Altair chart that only ever sends `max_points` points.
+
+    `series` is a list of (name, x, y, color) with x from `chart_x`, `bands`
+    a list of (name, x, low, high, (color, opacity)) shaded areas and
+    `marker` an x value drawn as a dashed rule. A small
+    overview of the whole range is drawn below the main chart; brushing it
+    reruns only this fragment, which slices the full arrays to the brushed
+    range and sends that range at full resolution (decimated only if it
+    still holds more than `max_points` points).
+    """
+    max_points = max_points or settings.CHART_MAX_POINTS
+    x_type = "x:T" if temporal else "x:Q"
+    x_scale = alt.Scale(type="utc") if temporal else alt.Scale(zero=False)
+    color_scale = alt.Scale(domain=[s[0] for s in series], range=[s[3] for s in series])
+
+    detail_slot = st.container()
+    overview = alt.Chart(_window_frame(series, None, max_points)).mark_line().encode(
+        x=alt.X(x_type, scale=x_scale, title=None),
+        y=alt.Y("value:Q", scale=alt.Scale(zero=False), title=None),
+        color=alt.Color("series:N", legend=None, scale=color_scale),
+    ).add_params(
+        alt.selection_interval(name="window", encodings=["x"])
+    ).properties(height=80)
+    event = st.altair_chart(overview, use_container_width=True, key=f"{key}_overview", on_select="rerun")
+    window = _selected_window(event, temporal)
+
+    frame = _window_frame(series, window, max_points)
+    x_encoding = alt.X(x_type, scale=x_scale, title=x_title)
+    layers = []
+    if bands:
+        band_frame = _band_frame(bands, window, max_points)
+        for name, _, _, _, (band_color, opacity) in bands:
+            layers.append(alt.Chart(band_frame[band_frame['band'] == name]).mark_area(
+                color=band_color, opacity=opacity
+            ).encode(x=x_encoding, y="low:Q", y2="high:Q"))
+    layers.append(alt.Chart(frame).mark_line().encode(
+        x=x_encoding,
+        y=alt.Y("value:Q", scale=alt.Scale(zero=False), title=y_title),
+        color=alt.Color("series:N", title=None, scale=color_scale),
+        tooltip=[alt.Tooltip("series:N", title="Series"),
+                 alt.Tooltip(x_type, title=x_title, format="%Y-%m-%d", formatType="utc") if temporal
+                 else alt.Tooltip(x_type, title=x_title),
+                 alt.Tooltip("value:Q", title=y_title, format=",.2f")],
+    ))
+    if marker is not None and (window is None or window[0] <= marker <= window[1]):
+        layers.append(alt.Chart(pd.DataFrame({'x': [marker]})).mark_rule(
+            color='red', strokeDash=[6, 4], opacity=0.7
+        ).encode(x=x_encoding))
+
+    with detail_slot:
+        st.altair_chart(alt.layer(*layers).properties(title=title, height=380), use_container_width=True)
+        total = sum(len(s[1]) for s in series)
+        st.caption(f"Menampilkan {len(frame)} dari {total} titik"
+                   + (" pada rentang terpilih" if window else "; pilih rentang pada grafik kecil untuk zoom"))
+
+def _price_series(*entries):
+    """
+    (name, x, y, color) tuples with x converted by `chart_x`, dropping empty
+    entries, and whether the x values are temporal.
+    """
+    series = []
+    temporal = False
+    for name, x, y, color in entries:
+        if len(x) and len(y):
+            n = min(len(x), len(y))
+            x_values, temporal = chart_x(x[:n])
+            series.append((name, x_values, np.asarray(y[:n], dtype=float), color))
+    return series, temporal
+
+def _plot_fitting_forecast_interactive(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list,
+                                       forecast_dates, S_forecast, actual_forecast_prices, forecast_bands):
+    # Forecast lines start at the last fitting point, as the connectors in the static chart do
+    joined = bool(fitting_dates) and bool(forecast_dates)
+    lead_dates = list(fitting_dates[-1:]) if joined else []
+    fitted_tail = list(Fitting_S_n_list[len(fitting_dates) - 1:len(fitting_dates)]) if joined else []
+    actual_tail = list(closing_prices[-1:]) if joined else []
+    series, temporal = _price_series(
+        ("Actual (Fitting)", fitting_dates, closing_prices, 'black'),
+        ("Fitted", fitting_dates, Fitting_S_n_list, 'blue'),
+        ("Actual (Forecast)", lead_dates + list(forecast_dates), actual_tail + list(actual_forecast_prices),
+         'darkgreen'),
+        ("Forecast", lead_dates + list(forecast_dates), fitted_tail + list(S_forecast), 'orange'),
+    )
+    bands = []
+    if forecast_bands and forecast_dates:
+        x, _ = chart_x(forecast_dates)
+        band_len = min(len(x), len(next(iter(forecast_bands.values()))))
+        for (low, high), opacity in (((5, 95), 0.15), ((25, 75), 0.3)):
+            if low in forecast_bands and high in forecast_bands:
+                bands.append((f"Ensemble {low}-{high}%", x[:band_len], np.asarray(forecast_bands[low][:band_len]),
+                              np.asarray(forecast_bands[high][:band_len]), ('orange', opacity)))
+    marker = None
+    if fitting_dates and forecast_dates:
+        marker = chart_x(fitting_dates[-1:])[0][0]
+    windowed_chart(f"forecast_{stock_symbol}", f"Fitting dan Forecast Harga Saham ({stock_symbol})", series,
+                   temporal, bands=bands, marker=marker)
+
+# Static chart panels: name -> (height, bottom margin) in inches; date panels
+# need room for rotated tick labels. All panels share one width.
+CHART_WIDTH = 12.0
+_PANELS = {'fit': (6.0, 1.1), 'forecast': (7.0, 1.1), 'mape_Fitting': (5.0, 0.7), 'mape_Forecast': (5.0, 0.7)}
+# Fixed left, right and top axes margins in inches, so no layout engine runs per render
+_MARGINS = (1.0, 0.3, 0.5)
+# Ensemble bands drawn on the forecast panel: (low, high, alpha)
+_BAND_STYLES = ((5, 95, 0.15), (25, 75, 0.3))
+_MAX_TEMPLATES = 8
+
+def _date_numbers(dates):
+    """Matplotlib date numbers of `dates`, keeping the wall-clock time of tz-aware values."""
+    index = pd.DatetimeIndex(dates)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return mdates.date2num(index.to_numpy())
+
+class ChartTemplate:
+    """
+    Prebuilt Agg figure holding the static charts of one run stacked as panels.
+
+    Axes, titles, legends, grid and line artists are created once. `render`
+    only swaps line data and rescales the axes, draws the whole canvas once
+    and slices it into one image per panel. A template is used by one render
+    at a time; `render_charts` checks templates out of a shared idle pool.
+    """
+
+    def __init__(self, panels, bands=()):
+        self.panels = panels
+        self.height = sum(_PANELS[name][0] for name in panels)
+        self.figure = Figure(figsize=(CHART_WIDTH, self.height), facecolor='white')
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes, self.artists, self.extents = {}, {}, {}
+        left, right, top_margin = _MARGINS
+        top = self.height
+        for name in panels:
+            height, bottom_margin = _PANELS[name]
+            bottom = top - height
+            ax = self.figure.add_axes([left / CHART_WIDTH, (bottom + bottom_margin) / self.height,
+                                       (CHART_WIDTH - left - right) / CHART_WIDTH,
+                                       (top - bottom - top_margin - bottom_margin) / self.height])
+            ax.grid(True, alpha=0.3)
+            self.axes[name] = ax
+            self.extents[name] = (top, bottom)
+            if name == 'fit':
+                self._build_fit(ax)
+            elif name == 'forecast':
+                self._build_forecast(ax, bands)
+            else:
+                self._build_mape(ax, name.split('_', 1)[1])
+            top = bottom
+
+    @staticmethod
+    def _line(ax, color, label=None, **kwargs):
+        line, = ax.plot([], [], color=color, linewidth=2, label=label, **kwargs)
+        return line
+
+    @staticmethod
+    def _date_axis(ax):
+        ax.xaxis_date()
+        ax.set_xlabel("Tanggal")
+        ax.set_ylabel("Harga")
+        ax.tick_params(axis='x', rotation=45)
+
+    def _build_fit(self, ax):
+        self._date_axis(ax)
+        self.artists['fit'] = {
+            'actual': self._line(ax, 'black', "Actual"),
+            'fitted': self._line(ax, 'blue', "Fitted"),
+        }
+        ax.legend()
+
+    def _build_forecast(self, ax, bands):
+        self._date_axis(ax)
+        artists = {
+            'actual': self._line(ax, 'black', "Actual (Fitting)"),
+            'fitted': self._line(ax, 'blue', "Fitted"),
+            'actual_forecast': self._line(ax, 'darkgreen', "Actual (Forecast)"),
+            'forecast': self._line(ax, 'orange', "Forecast"),
+            'forecast_join': self._line(ax, 'orange'),
+            'actual_join': self._line(ax, 'darkgreen'),
+            'start': ax.axvline(x=0, color='red', linestyle='--', label='Forecast Start', alpha=0.7),
+            'bands': {},
+        }
+        handles = [artists[key] for key in ('actual', 'fitted', 'actual_forecast', 'forecast')]
+        for low, high, alpha in _BAND_STYLES:
+            if (low, high) in bands:
+                artists['bands'][(low, high)] = ax.add_collection(
+                    PolyCollection([], facecolor='orange', alpha=alpha, linewidth=0)
+                )
+                handles.append(Patch(facecolor='orange', alpha=alpha, label=f"Ensemble {low}-{high}%"))
+        handles.append(artists['start'])
+        ax.legend(handles=handles)
+        self.artists['forecast'] = artists
+
+    def _build_mape(self, ax, period_type):
+        color = 'purple' if period_type == "Fitting" else 'orange'
+        self.artists[f'mape_{period_type}'] = {'mape': self._line(ax, color, f'MAPE {period_type} (%)')}
+        ax.set_xlabel("Hari")
+        ax.set_ylabel("MAPE (%)")
+        ax.legend()
+
+    def _update_forecast(self, ax, stock_symbol, fit_x, actual, fitted, forecast_x, forecast, actual_forecast,
+                         forecast_bands):
+        artists = self.artists['forecast']
+        artists['actual'].set_data(fit_x, actual)
+        artists['fitted'].set_data(fit_x, fitted)
+        n_actual = min(len(forecast_x), len(actual_forecast))
+        artists['actual_forecast'].set_data(forecast_x[:n_actual], actual_forecast[:n_actual])
+        artists['forecast'].set_data(forecast_x[:len(forecast)], forecast[:len(forecast_x)])
+        joined = len(fit_x) and len(forecast_x)
+        artists['forecast_join'].set_data(*((fit_x[-1:].tolist() + forecast_x[:1].tolist(),
+                                              fitted[-1:].tolist() + forecast[:1].tolist())
+                                             if joined and len(forecast) else ([], [])))
+        artists['actual_join'].set_data(*((fit_x[-1:].tolist() + forecast_x[:1].tolist(),
+                                            actual[-1:].tolist() + actual_forecast[:1].tolist())
+                                           if joined and len(actual_forecast) else ([], [])))
+        artists['start'].set_xdata([fit_x[-1], fit_x[-1]] if joined else [0, 0])
+        artists['start'].set_visible(bool(joined))
+        ax.relim()
+        for (low, high), collection in artists['bands'].items():
+            band_len = min(len(forecast_x), len(forecast_bands[low]), len(forecast_bands[high]))
+            x = forecast_x[:band_len]
+            lows = np.asarray(forecast_bands[low][:band_len], dtype=float)
+            highs = np.asarray(forecast_bands[high][:band_len], dtype=float)
+            collection.set_verts([np.column_stack([np.concatenate([x, x[::-1]]),
+                                                   np.concatenate([lows, highs[::-1]])])])
+            ax.update_datalim(np.column_stack([np.concatenate([x, x]), np.concatenate([lows, highs])]))
+        ax.autoscale_view()
+        ax.set_title(f"Fitting dan Forecast Harga Saham ({stock_symbol})")
+
+    def render(self, stock_symbol, dpi, fit_x=(), actual=(), fitted=(), forecast_x=(), forecast=(),
+               actual_forecast=(), mape=None, forecast_bands=None):
+        """Update every panel with the given arrays and return {panel: RGB image array}."""
+        if 'fit' in self.axes:
+            ax = self.axes['fit']
+            self.artists['fit']['actual'].set_data(fit_x, actual)
+            self.artists['fit']['fitted'].set_data(fit_x, fitted)
+            ax.relim()
+            ax.autoscale_view()
+            ax.set_title(f"Fitting Data Harga Saham ({stock_symbol})")
+        if 'forecast' in self.axes:
+            self._update_forecast(self.axes['forecast'], stock_symbol, fit_x, actual, fitted, forecast_x,
+                                  forecast, actual_forecast, forecast_bands)
+        for period_type, values in (mape or {}).items():
+            ax = self.axes[f'mape_{period_type}']
+            self.artists[f'mape_{period_type}']['mape'].set_data(np.arange(len(values)), values)
+            ax.relim()
+            ax.autoscale_view()
+            ax.set_title(f"Grafik MAPE Selama {period_type} ({stock_symbol})")
+
+        self.figure.set_dpi(dpi)
+        self.canvas.draw()
+        pixels = np.asarray(self.canvas.buffer_rgba())
+        scale = pixels.shape[0] / self.height
+        return {name: pixels[round((self.height - top) * scale):round((self.height - bottom) * scale), :, :3].copy()
+                for name, (top, bottom) in self.extents.items()}
+
+_template_lock = threading.Lock()
+# Idle templates by (panels, bands); a busy layout gets another template, so
+# concurrent sessions render in parallel and only the pool lookup is locked
+_idle_templates = OrderedDict()
+
+def _checkout_template(panels, bands):
+    with _template_lock:
+        idle = _idle_templates.get((panels, bands))
+        if idle:
+            _idle_templates.move_to_end((panels, bands))
+            return idle.pop()
+    return ChartTemplate(panels, bands)
+
+def _checkin_template(template, bands):
+    key = (template.panels, bands)
+    with _template_lock:
+        _idle_templates.setdefault(key, []).append(template)
+        _idle_templates.move_to_end(key)
+        idle_count = sum(len(idle) for idle in _idle_templates.values())
+        while idle_count > _MAX_TEMPLATES:
+            oldest_key, oldest = next(iter(_idle_templates.items()))
+            oldest.pop(0)
+            if not oldest:
+                del _idle_templates[oldest_key]
+            idle_count -= 1
+
+def render_charts(stock_symbol, fitting_dates=(), closing_prices=(), Fitting_S_n_list=(), forecast_dates=(),
+                  S_forecast=(), actual_forecast_prices=(), mape_fit=(), mape_forecast=(), forecast_bands=None,
+                  preview=False):
+    """
+    Render every static chart of a run in one figure pass.
+
+    Panels are included for the data given: the fit, the fit plus forecast
+    (when forecast and actual prices are given) and each MAPE series.
+    Returns {panel name: RGB image array}, at `settings.CHART_PREVIEW_DPI`
+    when `preview` is set and `settings.CHART_DPI` otherwise.
+    """
+    n_fit = min(len(fitting_dates), len(Fitting_S_n_list))
+    n_forecast = len(forecast_dates)
+    panels = tuple(name for name, present in (
+        ('fit', n_fit > 0),
+        ('forecast', n_fit > 0 and len(S_forecast) > 0 and len(actual_forecast_prices) > 0),
+        ('mape_Fitting', len(mape_fit) > 0),
+        ('mape_Forecast', len(mape_forecast) > 0),
+    ) if present)
+    if not panels:
+        return {}
+    bands = ()
+    if 'forecast' in panels and forecast_bands:
+        bands = tuple((low, high) for low, high, _ in _BAND_STYLES
+                      if low in forecast_bands and high in forecast_bands)
+    mape = {period_type: np.asarray(values, dtype=float)
+            for period_type, values in (("Fitting", mape_fit), ("Forecast", mape_forecast)) if len(values)}
+
+    # The fitting series is converted once and drawn on both price panels
+    fit_x = _date_numbers(fitting_dates[:n_fit]) if n_fit else np.empty(0)
+    forecast_x = _date_numbers(forecast_dates) if n_forecast else np.empty(0)
+    template = _checkout_template(panels, bands)
+    try:
+        return template.render(
+            stock_symbol, settings.CHART_PREVIEW_DPI if preview else settings.CHART_DPI,
+            fit_x=fit_x,
+            actual=np.asarray(closing_prices[:n_fit], dtype=float),
+            fitted=np.asarray(Fitting_S_n_list[:n_fit], dtype=float),
+            forecast_x=forecast_x,
+            forecast=np.asarray(S_forecast, dtype=float),
+            actual_forecast=np.asarray(actual_forecast_prices[:n_forecast], dtype=float),
+            mape=mape,
+            forecast_bands=forecast_bands,
+        )
+    finally:
+        _checkin_template(template, bands)
+
+def _show_image(image):
+    st.image(image, use_container_width=True, output_format="PNG")
+
+def plot_fitting(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list, interactive=False, image=None):
     st.subheader(f"📊 Grafik Fitting vs Actual ({stock_symbol})")
-    fig_fit, ax_fit = plt.subplots(figsize=(12, 6))
-    
-    # Plot with dates on x-axis
-    ax_fit.plot(fitting_dates, closing_prices, label="Actual", color='black', linewidth=2)
-    ax_fit.plot(fitting_dates, Fitting_S_n_list[:len(fitting_dates)], label="Fitted", color='blue', linewidth=2)
-    
-    ax_fit.set_title(f"Fitting Data Harga Saham ({stock_symbol})")
-    ax_fit.set_xlabel("Tanggal")
-    ax_fit.set_ylabel("Harga")
-    ax_fit.legend()
-    ax_fit.grid(True, alpha=0.3)
-    
-    # Format x-axis dates
-    ax_fit.tick_params(axis='x', rotation=45)
-    plt.tight_layout()
-    
-    st.pyplot(fig_fit)
-    
+    if interactive:
+        series, temporal = _price_series(("Actual", fitting_dates, closing_prices, 'black'),
+                                         ("Fitted", fitting_dates, Fitting_S_n_list, 'blue'))
+        windowed_chart(f"fit_{stock_symbol}", f"Fitting Data Harga Saham ({stock_symbol})", series, temporal)
+    else:
+        if image is None:
+            image = render_charts(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list)['fit']
+        _show_image(image)
+
     # Display table for fitting data
     display_fitting_table(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list)
 
 def plot_fitting_forecast(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list, 
-                         forecast_dates, S_forecast, actual_forecast_prices):
+                         forecast_dates, S_forecast, actual_forecast_prices, forecast_bands=None,
+                         interactive=False, image=None):
     st.subheader(f"📈 Grafik Fitting + Forecast vs Actual ({stock_symbol})")
-    fig_forecast, ax_forecast = plt.subplots(figsize=(14, 7))
-    
-    # Plot fitting period
-    ax_forecast.plot(fitting_dates, closing_prices, label="Actual (Fitting)", color='black', linewidth=2)
-    ax_forecast.plot(fitting_dates, Fitting_S_n_list[:len(fitting_dates)], label="Fitted", color='blue', linewidth=2)
-    
-    # Plot forecast period
-    ax_forecast.plot(forecast_dates, actual_forecast_prices, label="Actual (Forecast)", color='darkgreen', linewidth=2)
-    ax_forecast.plot(forecast_dates, S_forecast[:len(forecast_dates)], label="Forecast", color='orange', linewidth=2)
-    
-    if fitting_dates and forecast_dates and len(Fitting_S_n_list) > 0 and len(S_forecast) > 0:
-        last_fitting_date = fitting_dates[-1]
-        last_fitting_price = Fitting_S_n_list[len(fitting_dates)-1]
-        
-        first_forecast_date = forecast_dates[0]
-        first_forecast_price = S_forecast[0]
-        
-        ax_forecast.plot([last_fitting_date, first_forecast_date], 
-                        [last_fitting_price, first_forecast_price], 
-                        color='orange', linewidth=2, linestyle='-')
-    
-    if fitting_dates and forecast_dates and len(closing_prices) > 0 and len(actual_forecast_prices) > 0:
-        last_actual_fitting_date = fitting_dates[-1]
-        last_actual_fitting_price = closing_prices[-1]
-        
-        first_actual_forecast_date = forecast_dates[0]
-        first_actual_forecast_price = actual_forecast_prices[0]
-        
-        ax_forecast.plot([last_actual_fitting_date, first_actual_forecast_date], 
-                        [last_actual_fitting_price, first_actual_forecast_price], 
-                        color='darkgreen', linewidth=2, linestyle='-')
-    
-    # Add vertical line to separate fitting and forecast
-    if fitting_dates and forecast_dates:
-        ax_forecast.axvline(x=fitting_dates[-1], color='red', linestyle='--', 
-                           label='Forecast Start', alpha=0.7)
-    
-    ax_forecast.set_title(f"Fitting dan Forecast Harga Saham ({stock_symbol})")
-    ax_forecast.set_xlabel("Tanggal")
-    ax_forecast.set_ylabel("Harga")
-    ax_forecast.legend()
-    ax_forecast.grid(True, alpha=0.3)
-    
-    # Format x-axis dates
-    ax_forecast.tick_params(axis='x', rotation=45)
-    plt.tight_layout()
-    
-    st.pyplot(fig_forecast)
-    
+    if interactive:
+        _plot_fitting_forecast_interactive(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list,
+                                           forecast_dates, S_forecast, actual_forecast_prices, forecast_bands)
+    else:
+        if image is None:
+            image = render_charts(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list, forecast_dates,
+                                  S_forecast, actual_forecast_prices, forecast_bands=forecast_bands)['forecast']
+        _show_image(image)
+
     # Display table for fitting + forecast data
     display_fitting_forecast_table(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list,
                                   forecast_dates, S_forecast, actual_forecast_prices)
         
-def plot_mape(stock_symbol, mape_data, period_type, mean_mape):
+def plot_mape(stock_symbol, mape_data, period_type, mean_mape, interactive=False, image=None):
     st.subheader(f"📉 Hasil MAPE {period_type} - Rata-rata: {mean_mape:.2f}%")
-    fig_mape, ax_mape = plt.subplots(figsize=(10, 6))
-    ax_mape.plot(mape_data, color='purple' if period_type == "Fitting" else 'orange',
-                label=f'MAPE {period_type} (%)', linewidth=2)
-    ax_mape.set_title(f"Grafik MAPE Selama {period_type} ({stock_symbol})")
-    ax_mape.set_xlabel("Hari")
-    ax_mape.set_ylabel("MAPE (%)")
-    ax_mape.legend()
-    ax_mape.grid(True, alpha=0.3)
-    st.pyplot(fig_mape)
-    
+    if interactive:
+        color = 'purple' if period_type == "Fitting" else 'orange'
+        series, temporal = _price_series((f"MAPE {period_type} (%)", np.arange(len(mape_data)), mape_data, color))
+        windowed_chart(f"mape_{period_type}_{stock_symbol}", f"Grafik MAPE Selama {period_type} ({stock_symbol})",
+                       series, temporal, x_title="Hari", y_title="MAPE (%)")
+    else:
+        if image is None:
+            mape_series = {'mape_fit' if period_type == "Fitting" else 'mape_forecast': mape_data}
+            image = render_charts(stock_symbol, **mape_series)[f'mape_{period_type}']
+        _show_image(image)
+
     # Display table for MAPE data
     display_mape_table(stock_symbol, mape_data, period_type)
\ No newline at end of file
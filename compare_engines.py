@@ -0,0 +1,255 @@
+import argparse
+import logging
+import sys
+import time
+import numpy as np
+import pandas as pd
+from formula import fitting, fitting_vectorized, forecasting, forecasting_batch, _recurrence_step
+from tracer import PHASE_FIT, PHASE_FORECAST, StepTracer
+
+RANDOM_KINDS = ('random_walk', 'gbm', 'tick')
+
+def build_corpus(n_series, length, seed=0):
+    """
+    Price corpus as a list of (kind, prices).
+
+    Randomized kinds are split evenly over `n_series`. The adversarial kinds
+    target the 1e-12 guards, the zero denominators of `determine_alpha_n`
+    and `determine_beta_n`, the `h == 1` fallback, float64 overflow in
+    exp(beta) and every sign combination of the eight branches.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(length, dtype=float)
+    corpus = []
+    for i in range(n_series):
+        kind = RANDOM_KINDS[i % len(RANDOM_KINDS)]
+        if kind == 'random_walk':
+            prices = 100 + np.cumsum(rng.normal(size=length))
+        elif kind == 'gbm':
+            prices = 1000 * np.exp(np.cumsum(rng.normal(0, 0.02, size=length)))
+        else:
+            # IDX-style tick sizes: many repeated prices and equal moves
+            prices = 5 * np.round((5000 + np.cumsum(rng.normal(0, 20, size=length))) / 5)
+        corpus.append((kind, prices))
+
+    adversarial = {
+        'constant': np.full(length, 250.0),
+        'ramp': 100 + 0.5 * t,
+        'quadratic': 100 + 0.01 * t ** 2,
+        'alternating': 100 + np.where(t % 2 == 0, 1.0, -1.0),
+        'period_3': 100 + np.tile([0.0, 2.0, 5.0], length // 3 + 1)[:length],
+        'tiny_moves': 100 + np.cumsum(rng.normal(0, 1e-13, size=length)),
+        'guard_edge': 100 + np.cumsum(rng.choice([0.0, 1e-12, -1e-12, 2e-12], size=length)),
+        'steps': np.repeat(100 + np.cumsum(rng.normal(size=length // 10 + 1)), 10)[:length],
+        'large': 1e7 + np.cumsum(rng.normal(0, 1e4, size=length)),
+        'near_zero': np.abs(1e-3 + np.cumsum(rng.normal(0, 1e-4, size=length))),
+        'spikes': 100 + np.cumsum(rng.normal(size=length)) + np.where(rng.random(length) < 0.02, 500.0, 0.0),
+        'explosive': 100 * np.exp(np.cumsum(rng.normal(0, 0.5, size=length))),
+    }
+    corpus.extend(adversarial.items())
+    return corpus
+
+def reference_branches(tracer, phase, length):
+    """Branch per position from a `StepTracer` filled by the reference engine (-1 where none was recorded)."""
+    branches = np.full(length, -1)
+    records = tracer.records()
+    records = records[records['phase'] == phase]
+    branches[records['step']] = records['branch']
+    return branches
+
+def recurrence_branches(tail, values):
+    """Branch taken at every forecast step, recomputed from an engine's own output."""
+    sequence = np.concatenate([tail, values])
+    with np.errstate(all='ignore'):
+        _, branches = _recurrence_step(sequence[:-4], sequence[1:-3], sequence[2:-2], sequence[3:-1],
+                                       sequence[1:-3])
+    return branches
+
+class EngineReport:
+    """
+    Accumulated differences and timings of one engine against the reference.
+
+    Trajectory engines feed their own output back into the recurrence, so
+    a one-ulp difference (vectorized exp/log against mpmath's correctly
+    rounded results) grows step by step. For them only the first
+    `gate_steps` steps count towards the tolerance and branch checks, and
+    the number of steps every series stays within tolerance is reported.
+    """
+
+    def __init__(self, name, rtol, atol, gate_steps=None):
+        self.name = name
+        self.rtol = rtol
+        self.atol = atol
+        self.gate_steps = gate_steps
+        self.values = 0
+        self.max_abs_error = 0.0
+        self.max_rel_error = 0.0
+        self.out_of_tolerance = 0
+        self.branch_mismatches = 0
+        self.stable_steps = None
+        self.diverged_series = 0
+        self.reference_seconds = 0.0
+        self.engine_seconds = 0.0
+        self.worst = None
+
+    def compare(self, kind, reference, candidate, reference_branch=None, candidate_branch=None):
+        reference = np.asarray(reference, dtype=float)
+        candidate = np.asarray(candidate, dtype=float)
+        if reference.shape != candidate.shape:
+            self.out_of_tolerance += max(len(reference), len(candidate))
+            self.worst = self.worst or (kind, -1, "length mismatch")
+            return
+        both_finite = np.isfinite(reference) & np.isfinite(candidate)
+        same_nonfinite = ~both_finite & ((reference == candidate) | (np.isnan(reference) & np.isnan(candidate)))
+        abs_error = np.where(both_finite, np.abs(candidate - reference), 0.0)
+        rel_error = abs_error / np.maximum(np.abs(reference), np.finfo(float).tiny)
+        failed = ~(same_nonfinite | (both_finite & (abs_error <= self.atol + self.rtol * np.abs(reference))))
+
+        if self.gate_steps is not None:
+            first_failure = int(np.argmax(failed)) if failed.any() else len(failed)
+            self.stable_steps = first_failure if self.stable_steps is None else min(self.stable_steps, first_failure)
+            self.diverged_series += int(failed.any())
+            abs_error, rel_error, failed, both_finite, reference, candidate = (
+                a[:self.gate_steps] for a in (abs_error, rel_error, failed, both_finite, reference, candidate)
+            )
+            if reference_branch is not None and candidate_branch is not None:
+                reference_branch = reference_branch[:self.gate_steps]
+                candidate_branch = candidate_branch[:self.gate_steps]
+
+        self.values += len(reference)
+        if len(reference):
+            self.max_abs_error = max(self.max_abs_error, float(abs_error.max()))
+            self.max_rel_error = max(self.max_rel_error, float(rel_error[both_finite].max(initial=0.0)))
+        if failed.any():
+            self.out_of_tolerance += int(failed.sum())
+            position = int(np.argmax(failed))
+            self.worst = self.worst or (kind, position, f"reference {reference[position]!r}, "
+                                                        f"engine {candidate[position]!r}")
+        if reference_branch is not None and candidate_branch is not None:
+            self.branch_mismatches += int(np.sum(np.asarray(reference_branch) != np.asarray(candidate_branch)))
+
+    def row(self):
+        return {
+            'Engine': self.name,
+            'Values': self.values,
+            'Max Abs Error': self.max_abs_error,
+            'Max Rel Error': self.max_rel_error,
+            'Out of Tolerance': self.out_of_tolerance,
+            'Branch Mismatches': self.branch_mismatches,
+            'Stable Steps': self.stable_steps if self.gate_steps is not None else '-',
+            'Diverged Series': self.diverged_series if self.gate_steps is not None else '-',
+            'Reference (s)': round(self.reference_seconds, 3),
+            'Engine (s)': round(self.engine_seconds, 3),
+            'Speedup': round(self.reference_seconds / self.engine_seconds, 1) if self.engine_seconds else None,
+        }
+
+def run_comparison(corpus, horizon, rtol, atol, trajectory_steps):
+    """
+    Run the reference and every fast engine over `corpus`.
+
+    Returns {engine name: EngineReport}. `fitting_vectorized` and the
+    one-step forecast check evaluate every step from the reference's own
+    inputs; the forecasting engines are compared as full trajectories.
+    """
+    reports = {
+        'fitting_vectorized': EngineReport('fitting_vectorized', rtol, atol),
+        'forecast step': EngineReport('forecast step (vectorized)', rtol, atol),
+        'forecasting (cycles)': EngineReport('forecasting (cycles)', rtol, atol, gate_steps=horizon),
+        'forecasting_batch': EngineReport('forecasting_batch', rtol, atol, gate_steps=trajectory_steps),
+        'forecasting_batch (no cycles)': EngineReport('forecasting_batch (no cycles)', rtol, atol,
+                                                      gate_steps=trajectory_steps),
+    }
+    forecast_frame = pd.DataFrame({'Close': np.zeros(horizon)}, index=pd.RangeIndex(horizon))
+    tails, reference_forecasts, reference_forecast_branches, kinds = [], [], [], []
+
+    for kind, prices in corpus:
+        # The reference runs on Python floats, as it does in the app
+        price_list = [float(p) for p in prices]
+
+        tracer = StepTracer(capacity=len(price_list) + horizon)
+        started = time.perf_counter()
+        Fitting_S_n_list, _ = fitting(price_list, kind, tracer=tracer)
+        reports['fitting_vectorized'].reference_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        fast_fit, _, fast_branches = fitting_vectorized(prices, return_branches=True)
+        reports['fitting_vectorized'].engine_seconds += time.perf_counter() - started
+        reports['fitting_vectorized'].compare(kind, Fitting_S_n_list, fast_fit,
+                                              reference_branches(tracer, PHASE_FIT, len(price_list)), fast_branches)
+
+        started = time.perf_counter()
+        S_forecast, _, _ = forecasting(Fitting_S_n_list, forecast_frame, kind, detect_cycles=False, tracer=tracer)
+        reference_seconds = time.perf_counter() - started
+        for name in ('forecast step', 'forecasting (cycles)', 'forecasting_batch', 'forecasting_batch (no cycles)'):
+            reports[name].reference_seconds += reference_seconds
+        tail = np.asarray(Fitting_S_n_list[-4:], dtype=float)
+        forecast_branches = reference_branches(tracer, PHASE_FORECAST, horizon)
+
+        # One vectorized step from each state of the reference trajectory
+        states = np.concatenate([tail, S_forecast])
+        started = time.perf_counter()
+        with np.errstate(all='ignore'):
+            step_values, step_branches = _recurrence_step(states[:-4], states[1:-3], states[2:-2], states[3:-1],
+                                                          states[1:-3])
+        reports['forecast step'].engine_seconds += time.perf_counter() - started
+        reports['forecast step'].compare(kind, S_forecast, step_values, forecast_branches, step_branches)
+
+        started = time.perf_counter()
+        cycle_forecast, _, _ = forecasting(Fitting_S_n_list, forecast_frame, kind, detect_cycles=True)
+        reports['forecasting (cycles)'].engine_seconds += time.perf_counter() - started
+        reports['forecasting (cycles)'].compare(kind, S_forecast, cycle_forecast, forecast_branches,
+                                                recurrence_branches(tail, np.asarray(cycle_forecast, dtype=float)))
+
+        tails.append(tail)
+        reference_forecasts.append(S_forecast)
+        reference_forecast_branches.append(forecast_branches)
+        kinds.append(kind)
+
+    # The batched engine advances the whole corpus at once
+    for name, detect_cycles in (('forecasting_batch', True), ('forecasting_batch (no cycles)', False)):
+        started = time.perf_counter()
+        batch = forecasting_batch(np.array(tails), horizon, detect_cycles=detect_cycles)
+        reports[name].engine_seconds += time.perf_counter() - started
+        for kind, tail, reference, branches, values in zip(kinds, tails, reference_forecasts,
+                                                            reference_forecast_branches, batch):
+            reports[name].compare(kind, reference, values, branches, recurrence_branches(tail, values))
+    return reports
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Differential accuracy and speed check of the fast engines against the mpmath reference."
+    )
+    parser.add_argument("--series", type=int, default=150, help="Number of randomized price series")
+    parser.add_argument("--length", type=int, default=500, help="Points per price series")
+    parser.add_argument("--horizon", type=int, default=250, help="Forecast steps per series")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance per value")
+    parser.add_argument("--atol", type=float, default=1e-9, help="Absolute tolerance per value")
+    parser.add_argument("--max-branch-mismatches", type=int, default=0,
+                        help="Allowed branch disagreements per engine")
+    parser.add_argument("--trajectory-steps", type=int, default=40,
+                        help="Leading forecast steps of the batched trajectories held to the tolerance")
+    args = parser.parse_args()
+
+    # Engine fallbacks on the adversarial corpus would otherwise flood the output
+    logging.basicConfig(level=logging.CRITICAL, format="%(levelname)s | %(message)s")
+    corpus = build_corpus(args.series, args.length, args.seed)
+    print(f"Corpus: {len(corpus)} series of {args.length} points, forecast horizon {args.horizon}")
+    reports = run_comparison(corpus, args.horizon, args.rtol, args.atol, args.trajectory_steps)
+
+    table = pd.DataFrame([report.row() for report in reports.values()])
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(table.to_string(index=False))
+
+    failed = False
+    for report in reports.values():
+        if report.out_of_tolerance or report.branch_mismatches > args.max_branch_mismatches:
+            failed = True
+            print(f"FAIL {report.name}: {report.out_of_tolerance} values out of tolerance, "
+                  f"{report.branch_mismatches} branch mismatches; first failure: {report.worst}")
+    if not failed:
+        print(f"OK: all engines within rtol={args.rtol:g}, atol={args.atol:g}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
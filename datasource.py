@@ -0,0 +1,276 @@
+import logging
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from metrics import FETCH_SECONDS, FETCH_FAILURES, record_cache
+from result_cache import get_result_cache, make_cache_key
+import settings
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+class DataProvider:
+    """
+    Interface for market data sources used by `store.get_data_with_dates`.
+
+    Subclasses implement `_validate_symbol` and `_history`; the public methods
+    add latency and failure metrics. `history` returns a frame indexed by
+    'Date' with single-level OHLCV columns covering [start, end).
+    """
+    name = "base"
+
+    def validate_symbol(self, symbol):
+        """Return True if the provider knows the symbol."""
+        try:
+            with FETCH_SECONDS.time(source=self.name, endpoint="validate"):
+                return self._validate_symbol(symbol)
+        except Exception as e:
+            FETCH_FAILURES.inc(source=self.name, endpoint="validate", reason="error")
+            logging.error(f"Invalid stock symbol {symbol}: {e}")
+            return False
+
+    def history(self, symbol, start, end):
+        """Return daily OHLCV data for `symbol` from `start` (inclusive) to `end` (exclusive)."""
+        try:
+            with FETCH_SECONDS.time(source=self.name, endpoint="history"):
+                data = self._history(symbol, start, end)
+        except Exception:
+            FETCH_FAILURES.inc(source=self.name, endpoint="history", reason="error")
+            raise
+        if data is None or data.empty:
+            FETCH_FAILURES.inc(source=self.name, endpoint="history", reason="empty")
+            return pd.DataFrame()
+        return data
+
+    def _validate_symbol(self, symbol):
+        return True
+
+    def _history(self, symbol, start, end):
+        raise NotImplementedError
+
+class YahooProvider(DataProvider):
+    """Fetches data from Yahoo Finance over the network."""
+    name = "yahoo"
+
+    def _validate_symbol(self, symbol):
+        # Fetch minimal data to check if symbol is valid
+        yf.Ticker(symbol).info
+        return True
+
+    def _history(self, symbol, start, end):
+        data = yf.download(symbol, start=start, end=end, auto_adjust=False)
+        # Handle multi-ticker data
+        if isinstance(data.columns, pd.MultiIndex):
+            logging.warning(f"Multi-ticker data detected for {symbol}. Selecting first ticker.")
+            data = data.xs(symbol, axis=1, level=1, drop_level=True)
+        return data
+
+def _slice_dates(data, start, end):
+    """Slice a date-sorted frame to [start, end) without copying."""
+    index = data.index
+    lo = index.searchsorted(pd.Timestamp(start), side='left')
+    hi = index.searchsorted(pd.Timestamp(end), side='left')
+    return data.iloc[lo:hi]
+
+class LocalFileProvider(DataProvider):
+    """
+    Reads a bulk archive of many symbols from local Parquet or CSV files.
+
+    `path` is either a directory holding one file per symbol
+    (`BBCA.JK.parquet` or `BBCA.JK.csv`), or a single long-format file with a
+    'Symbol' column next to 'Date' and the OHLCV columns. Files are
+    memory-mapped and parsed once per process; later requests only slice the
+    cached frames.
+    """
+    name = "local"
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._archive = None
+
+    def _validate_symbol(self, symbol):
+        return self._frame(symbol) is not None
+
+    def _history(self, symbol, start, end):
+        frame = self._frame(symbol)
+        if frame is None:
+            return pd.DataFrame()
+        return _slice_dates(frame, start, end)
+
+    @staticmethod
+    def _read(path):
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path, memory_map=True)
+        return pd.read_csv(path, memory_map=True, parse_dates=['Date'])
+
+    @staticmethod
+    def _prepare(frame):
+        if 'Date' in frame.columns:
+            frame = frame.set_index('Date')
+        frame.index = pd.DatetimeIndex(frame.index, name='Date')
+        columns = [c for c in OHLCV_COLUMNS if c in frame.columns]
+        return frame[columns].sort_index()
+
+    def _frame(self, symbol):
+        with self._lock:
+            if symbol in self._frames:
+                return self._frames[symbol]
+            if os.path.isdir(self.path):
+                frame = None
+                for extension in ('.parquet', '.csv'):
+                    candidate = os.path.join(self.path, f"{symbol}{extension}")
+                    if os.path.exists(candidate):
+                        frame = self._prepare(self._read(candidate))
+                        break
+            else:
+                if self._archive is None:
+                    archive = self._read(self.path)
+                    self._archive = {s: self._prepare(g.drop(columns='Symbol'))
+                                     for s, g in archive.groupby('Symbol', sort=False)}
+                frame = self._archive.get(symbol)
+            self._frames[symbol] = frame
+            return frame
+
+class ReplayProvider(DataProvider):
+    """
+    Serves previously recorded responses from a directory of Parquet files.
+
+    With an `upstream` provider, requests that have no recording are fetched
+    from upstream and recorded, so a run against Yahoo can be replayed later
+    without network access. Empty responses are not recorded, so a failed
+    fetch is retried on the next run instead of replaying as "no data".
+    """
+    name = "replay"
+
+    def __init__(self, directory, upstream=None):
+        self.directory = directory
+        self.upstream = upstream
+
+    def _recording_path(self, symbol, start, end):
+        safe_symbol = re.sub(r'[^A-Za-z0-9._-]', '_', symbol)
+        return os.path.join(self.directory, f"{safe_symbol}_{pd.Timestamp(start):%Y%m%d}_{pd.Timestamp(end):%Y%m%d}.parquet")
+
+    def _validate_symbol(self, symbol):
+        if self.upstream is not None:
+            return self.upstream.validate_symbol(symbol)
+        return True
+
+    def _history(self, symbol, start, end):
+        path = self._recording_path(symbol, start, end)
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+        if self.upstream is None:
+            logging.error(f"No recorded response for {symbol} {start} - {end} in {self.directory}")
+            return pd.DataFrame()
+        data = self.upstream.history(symbol, start, end)
+        if not data.empty:
+            os.makedirs(self.directory, exist_ok=True)
+            data.to_parquet(path)
+        return data
+
+class CachingProvider(DataProvider):
+    """
+    Wraps a network provider with the shared SQLite cache.
+
+    Histories and symbol validations are kept for `ttl` seconds, so a
+    response fetched by one process (for example the prefetch scheduler)
+    is served to every other process. `refresh` bypasses the cache and
+    overwrites the entry.
+    """
+
+    def __init__(self, upstream, cache, ttl):
+        self.upstream = upstream
+        self.cache = cache
+        self.ttl = ttl
+        self.name = f"cached_{upstream.name}"
+
+    def _key(self, kind, symbol, *parts):
+        return make_cache_key(kind, self.upstream.name, symbol, *parts)
+
+    def validate_symbol(self, symbol):
+        key = self._key("validate", symbol)
+        hit = self.cache.get(key, max_age=self.ttl) is not None
+        record_cache("prices", hit)
+        if hit:
+            return True
+        valid = self.upstream.validate_symbol(symbol)
+        if valid:
+            self.cache.put(key, symbol, {'valid': np.ones(1)})
+        return valid
+
+    def history(self, symbol, start, end):
+        arrays = self.cache.get(self._key("history", symbol, start, end), max_age=self.ttl)
+        record_cache("prices", arrays is not None)
+        if arrays is not None:
+            return _frame_from_arrays(arrays)
+        return self.refresh(symbol, start, end)
+
+    def refresh(self, symbol, start, end):
+        """Fetch from upstream and overwrite the cached history."""
+        data = self.upstream.history(symbol, start, end)
+        if not data.empty:
+            self.cache.put(self._key("history", symbol, start, end), symbol, _frame_to_arrays(data))
+            self.cache.put(self._key("validate", symbol), symbol, {'valid': np.ones(1)})
+        return data
+
+def _frame_to_arrays(data):
+    arrays = {'__index__': data.index.asi8, '__columns__': np.array([str(c) for c in data.columns])}
+    for position, column in enumerate(data.columns):
+        arrays[f"column_{position}"] = data[column].to_numpy()
+    if data.index.tz is not None:
+        arrays['__tz__'] = np.array([str(data.index.tz)])
+    return arrays
+
+def _frame_from_arrays(arrays):
+    index = pd.DatetimeIndex(arrays['__index__'].astype('datetime64[ns]'), name='Date')
+    if '__tz__' in arrays:
+        index = index.tz_localize('UTC').tz_convert(str(arrays['__tz__'][0]))
+    columns = arrays['__columns__'].tolist()
+    return pd.DataFrame({column: arrays[f"column_{position}"] for position, column in enumerate(columns)},
+                        index=index)
+
+_provider_lock = threading.Lock()
+_provider = None
+
+def create_provider(source=None, price_cache=None):
+    """
+    Build a provider from a source name ('yahoo', 'local' or 'replay').
+
+    Yahoo prices go through the shared price cache when `price_cache` is
+    True; by default only when a prefetch universe is configured, so the
+    interactive app without a scheduler always fetches fresh prices.
+    """
+    source = (source or settings.DATA_SOURCE).lower()
+    if price_cache is None:
+        price_cache = bool(settings.PREFETCH_SYMBOLS)
+    if source == "yahoo":
+        cache = get_result_cache() if price_cache else None
+        if cache is not None and settings.PRICE_CACHE_TTL_SECONDS > 0:
+            return CachingProvider(YahooProvider(), cache, settings.PRICE_CACHE_TTL_SECONDS)
+        return YahooProvider()
+    if source == "local":
+        if not settings.DATA_PATH:
+            raise ValueError("STOCKS_DATA_PATH must point to a local archive for the 'local' data source.")
+        return LocalFileProvider(settings.DATA_PATH)
+    if source == "replay":
+        upstream = YahooProvider() if settings.REPLAY_RECORD else None
+        return ReplayProvider(settings.REPLAY_DIR, upstream=upstream)
+    raise ValueError(f"Unknown data source: {source}")
+
+def get_provider():
+    """Return the process-wide provider configured by STOCKS_DATA_SOURCE."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_provider()
+        return _provider
+
+def set_provider(provider):
+    """Replace the process-wide provider, e.g. for offline benchmarks."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -3,33 +3,32 @@ from io import BytesIO
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 from datetime import datetime
+from itertools import chain, repeat
+import hashlib
 import logging
+import multiprocessing
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from metrics import EXPORT_SECONDS, EXPORT_BYTES, record_cache
+from pipeline import run_analysis
+from analytics import fit_analytics
+import settings
 
 def create_excel_download(stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list, 
-                        forecast_dates, S_forecast, actual_forecast_prices):
+                        forecast_dates, S_forecast, actual_forecast_prices, analytics=None):
     try:
-        # Create fitting dataframe
-        fitting_df = pd.DataFrame({
-            'Date': fitting_dates,
-            'Actual_Price': fitting_prices,
-            'Fitted_Price': Fitting_S_n_list[:len(fitting_dates)],
-            'Forecast_Price': None,
-            'Type': 'Fitting'
-        })
-        
-        # Create forecast dataframe if available
+        start_time = time.perf_counter()
+        # Build rows straight from the input lists; no intermediate DataFrames
+        rows = zip(fitting_dates, fitting_prices, Fitting_S_n_list[:len(fitting_dates)],
+                   repeat(None), repeat('Fitting'))
         if forecast_dates and S_forecast and actual_forecast_prices:
             min_len = min(len(forecast_dates), len(S_forecast), len(actual_forecast_prices))
-            forecast_df = pd.DataFrame({
-                'Date': forecast_dates[:min_len],
-                'Actual_Price': actual_forecast_prices[:min_len],
-                'Fitted_Price': None,
-                'Forecast_Price': S_forecast[:min_len],
-                'Type': 'Forecast'
-            })
-            combined_df = pd.concat([fitting_df, forecast_df], ignore_index=True)
-        else:
-            combined_df = fitting_df
+            rows = chain(rows, zip(forecast_dates[:min_len], actual_forecast_prices[:min_len],
+                                   repeat(None), S_forecast[:min_len], repeat('Forecast')))
         
         # Create Excel file
         output = BytesIO()
@@ -57,19 +56,19 @@ def create_excel_download(stock_symbol, fitting_dates, fitting_prices, Fitting_S
             cell.alignment = Alignment(horizontal="center")
         
         # Add data rows
-        for row_idx, (_, row) in enumerate(combined_df.iterrows(), 7):
-            if pd.notna(row['Date']):
-                if hasattr(row['Date'], 'strftime'):
-                    ws.cell(row=row_idx, column=1, value=row['Date'].strftime('%Y-%m-%d'))
+        for row_idx, (date, actual_price, fitted_price, forecast_price, row_type) in enumerate(rows, 7):
+            if pd.notna(date):
+                if hasattr(date, 'strftime'):
+                    ws.cell(row=row_idx, column=1, value=date.strftime('%Y-%m-%d'))
                 else:
-                    ws.cell(row=row_idx, column=1, value=str(row['Date']))
+                    ws.cell(row=row_idx, column=1, value=str(date))
             else:
                 ws.cell(row=row_idx, column=1, value="")
                 
-            ws.cell(row=row_idx, column=2, value=row['Actual_Price'])
-            ws.cell(row=row_idx, column=3, value=row['Fitted_Price'])
-            ws.cell(row=row_idx, column=4, value=row['Forecast_Price'])
-            ws.cell(row=row_idx, column=5, value=row['Type'])
+            ws.cell(row=row_idx, column=2, value=actual_price)
+            ws.cell(row=row_idx, column=3, value=fitted_price)
+            ws.cell(row=row_idx, column=4, value=forecast_price)
+            ws.cell(row=row_idx, column=5, value=row_type)
         
         # Auto-adjust column widths
         for column in ws.columns:
@@ -84,11 +83,214 @@ def create_excel_download(stock_symbol, fitting_dates, fitting_prices, Fitting_S
             adjusted_width = min(max_length + 2, 20)
             ws.column_dimensions[column_letter].width = adjusted_width
         
+        # The run's own `analytics.FitAnalytics`, so the sheet matches what the app shows
+        if analytics is not None:
+            _write_analytics_sheet(wb, analytics)
+        
         wb.save(output)
         output.seek(0)
         
-        return output.getvalue()
+        excel_bytes = output.getvalue()
+        EXPORT_SECONDS.observe(time.perf_counter() - start_time, format="xlsx")
+        EXPORT_BYTES.observe(len(excel_bytes), format="xlsx")
+        return excel_bytes
         
     except Exception as e:
         logging.error(f"Error in create_excel_download: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+def _write_analytics_sheet(wb, analytics):
+    """Add the whole-fit figures and per-point residual table as an "Analytics" sheet."""
+    ws = wb.create_sheet("Analytics")
+    ws['A1'] = "Fit Analytics"
+    ws['A1'].font = Font(size=14, bold=True)
+    ws.append([])
+    for metric, value in analytics.summary_frame().itertuples(index=False):
+        ws.append([metric, value])
+    ws.append([])
+
+    points = analytics.points.assign(Date=pd.to_datetime(analytics.points['Date']).dt.strftime('%Y-%m-%d'))
+    ws.append(list(points.columns))
+    for cell in ws[ws.max_row]:
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center")
+    for row in points.astype(object).where(points.notna(), None).itertuples(index=False):
+        ws.append(list(row))
+    ws.column_dimensions['A'].width = 24
+
+_excel_lock = threading.Lock()
+_excel_cache = OrderedDict()
+_excel_pending = {}
+_excel_executor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS, thread_name_prefix="excel-export")
+
+def excel_cache_key(stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list,
+                    forecast_dates, S_forecast, actual_forecast_prices, analytics=None):
+    """Content hash of the inputs of `create_excel_download`."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(stock_symbol.encode("utf-8"))
+    for dates in (fitting_dates, forecast_dates):
+        digest.update(b"|dates|")
+        digest.update(pd.DatetimeIndex(dates).asi8.tobytes())
+    for values in (fitting_prices, Fitting_S_n_list, S_forecast, actual_forecast_prices):
+        digest.update(b"|values|")
+        digest.update(np.asarray(values, dtype=float).tobytes())
+    if analytics is not None:
+        # Everything else in the sheet follows from the values above
+        digest.update(b"|analytics|")
+        digest.update(repr(analytics.windows).encode("utf-8"))
+        digest.update(analytics.points['Velocity'].to_numpy().tobytes())
+    return digest.hexdigest()
+
+def _store_excel(key, excel_bytes):
+    with _excel_lock:
+        _excel_cache[key] = excel_bytes
+        _excel_cache.move_to_end(key)
+        while len(_excel_cache) > settings.EXCEL_CACHE_SIZE:
+            _excel_cache.popitem(last=False)
+        _excel_pending.pop(key, None)
+
+def _build_excel(key, export_kwargs):
+    try:
+        excel_bytes = create_excel_download(**export_kwargs)
+    except Exception:
+        with _excel_lock:
+            _excel_pending.pop(key, None)
+        raise
+    _store_excel(key, excel_bytes)
+    return excel_bytes
+
+def is_excel_ready(key):
+    """True if the workbook for `key` has already been built."""
+    with _excel_lock:
+        return key in _excel_cache
+
+def submit_excel_build(key, export_kwargs):
+    """Start building the workbook for `key` in a background worker if it is not cached."""
+    with _excel_lock:
+        if key in _excel_cache or key in _excel_pending:
+            return
+        _excel_pending[key] = _excel_executor.submit(_build_excel, key, export_kwargs)
+
+def get_excel_download(key, export_kwargs):
+    """
+    Return the workbook bytes for `key`, building them only if neither the
+    cache nor a background build already has them.
+    """
+    with _excel_lock:
+        excel_bytes = _excel_cache.get(key)
+        if excel_bytes is not None:
+            _excel_cache.move_to_end(key)
+        future = _excel_pending.get(key)
+    record_cache("excel", excel_bytes is not None)
+    if excel_bytes is not None:
+        return excel_bytes
+    if future is not None:
+        return future.result()
+    return _build_excel(key, export_kwargs)
+
+def _build_symbol_report(stock_symbol, start_date, end_date, forecast_end_date, resolution='daily'):
+    """Process-pool worker: analyse one symbol and return its workbook and summary row."""
+    summary = {'Symbol': stock_symbol, 'Status': 'OK', 'Fitting Points': None,
+               'MAPE Fitting (%)': None, 'MAPE Forecast (%)': None, 'Forecast Points': None,
+               'RMSE Fitting': None, 'Direction Accuracy (%)': None}
+    try:
+        result = run_analysis(stock_symbol, start_date, end_date, forecast_end_date, resolution=resolution)
+        if result is None:
+            summary['Status'] = 'Insufficient data'
+            return stock_symbol, None, summary
+        analytics = fit_analytics(result.fitting_dates, result.fitting_prices, result.Fitting_S_n_list,
+                                  result.v_list)
+        excel_bytes = create_excel_download(
+            stock_symbol=stock_symbol,
+            fitting_dates=result.fitting_dates,
+            fitting_prices=result.fitting_prices,
+            Fitting_S_n_list=result.Fitting_S_n_list,
+            forecast_dates=result.forecast_dates,
+            S_forecast=result.S_forecast,
+            actual_forecast_prices=result.actual_forecast_prices,
+            analytics=analytics
+        )
+        summary.update({
+            'Fitting Points': len(result.fitting_prices),
+            'MAPE Fitting (%)': result.mean_mape_fit,
+            'MAPE Forecast (%)': result.mean_mape_forecast,
+            'Forecast Points': len(result.S_forecast),
+        })
+        if analytics is not None:
+            summary['RMSE Fitting'] = analytics.rmse
+            summary['Direction Accuracy (%)'] = analytics.direction_accuracy
+        return stock_symbol, excel_bytes, summary
+    except Exception as e:
+        logging.error(f"Report for {stock_symbol} failed: {e}")
+        summary['Status'] = f"Error: {e}"
+        return stock_symbol, None, summary
+
+def create_summary_workbook(summary_rows, start_date, end_date, forecast_end_date, resolution='daily'):
+    """Workbook with one row of fit and forecast MAPE per symbol."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Summary"
+    ws['A1'] = "Watchlist Report Summary"
+    ws['A1'].font = Font(size=14, bold=True)
+    ws['A2'] = f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    ws['A3'] = (f"Fitting Period: {start_date} to {end_date} | Forecast until: {forecast_end_date}"
+                f" | Resolution: {resolution}")
+
+    headers = ['Symbol', 'Status', 'Fitting Points', 'MAPE Fitting (%)', 'MAPE Forecast (%)', 'Forecast Points',
+               'RMSE Fitting', 'Direction Accuracy (%)']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=5, column=col, value=header)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
+        cell.alignment = Alignment(horizontal="center")
+        ws.column_dimensions[cell.column_letter].width = 20
+    for row_idx, row in enumerate(sorted(summary_rows, key=lambda r: r['Symbol']), 6):
+        for col, header in enumerate(headers, 1):
+            ws.cell(row=row_idx, column=col, value=row[header])
+
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+def write_report_bundle(stock_symbols, start_date, end_date, forecast_end_date, fileobj, max_workers=None,
+                        resolution='daily'):
+    """
+    Write one workbook per symbol plus `summary.xlsx` into a ZIP in `fileobj`.
+
+    Symbols are analysed across a process pool. At most two workbooks per
+    worker are in flight; each is written to the archive as soon as it is
+    ready and then dropped. Returns the summary rows.
+    """
+    start_time = time.perf_counter()
+    max_workers = max_workers or settings.BUNDLE_WORKERS
+    symbols = list(dict.fromkeys(stock_symbols))
+    summary_rows = []
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive, \
+            ProcessPoolExecutor(max_workers=max_workers,
+                                mp_context=multiprocessing.get_context("spawn")) as pool:
+        remaining = iter(symbols)
+        in_flight = set()
+        while True:
+            for stock_symbol in remaining:
+                in_flight.add(pool.submit(_build_symbol_report, stock_symbol, start_date, end_date,
+                                          forecast_end_date, resolution))
+                if len(in_flight) >= max_workers * 2:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                stock_symbol, excel_bytes, summary = future.result()
+                summary_rows.append(summary)
+                if excel_bytes is not None:
+                    archive.writestr(f"{stock_symbol}_analysis.xlsx", excel_bytes)
+        archive.writestr("summary.xlsx", create_summary_workbook(summary_rows, start_date, end_date,
+                                                                      forecast_end_date, resolution))
+
+    fileobj.seek(0, 2)
+    EXPORT_BYTES.observe(fileobj.tell(), format="zip")
+    fileobj.seek(0)
+    EXPORT_SECONDS.observe(time.perf_counter() - start_time, format="zip")
+    logging.info(f"Report bundle for {len(symbols)} symbols written in {time.perf_counter() - start_time:.1f}s")
+    return summary_rows
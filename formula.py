@@ -3,9 +3,14 @@ import numpy as np
 import mpmath as mp
 import logging
 from store import get_data, filter_prices_duplicates
+from tracer import PHASE_FIT, PHASE_FORECAST, GUARD_ALPHA, GUARD_BETA, GUARD_FALLBACK, GUARD_V, guard_flags
 
 mp.dps = 100
 
+# Bump whenever a change alters fitting or forecasting output so cached
+# results from older engines are not reused.
+ENGINE_VERSION = "1"
+
 def determine_v_n(Sn, Sn_1):
     v_n = (Sn - Sn_1) / 1 #delta_t = 1
     if abs(v_n) < 1e-12:
@@ -43,7 +48,6 @@ def determine_h_n(v_1, alpha_n, beta_n):
         return 1.0
 
 def determine_s_n(s1, alpha, beta, h, condition_1, s_n, v_n, v_1):
-    logging.debug(f"determine_s_n called with: s1={s1}, alpha={alpha}, beta={beta}, h={h}, condition_1={condition_1}, s_n={s_n}, v_n={v_n}, v_1={v_1}")
     if abs(alpha) < 1e-12:
         alpha = 1e-12
     if abs(beta) < 1e-12:
@@ -70,12 +74,27 @@ def determine_s_n(s1, alpha, beta, h, condition_1, s_n, v_n, v_1):
     except (ZeroDivisionError) as e:
         logging.error(f'Error in determine_s_n: {e}. Using fallback value.')
         s_n = s1
-    logging.debug(f'determine_s_n result: s_n={s_n}')
     return s_n
 
+# (sign of condition_1, condition_2, condition_3) of each `determine_s_n` branch, in source order
+_BRANCH_CONDITIONS = [(1, True, True), (1, True, False), (-1, True, True), (-1, True, False),
+                      (1, False, True), (1, False, False), (-1, False, True), (-1, False, False)]
+
+def branch_taken(condition_1, condition_2, condition_3):
+    """Index (0-7) of the `determine_s_n` branch taken, in source order, or -1 if none is."""
+    conditions = ((condition_1 > 0) - (condition_1 < 0), bool(condition_2), bool(condition_3))
+    for index, branch_conditions in enumerate(_BRANCH_CONDITIONS):
+        if conditions == branch_conditions:
+            return index
+    return -1
+
+def _trace_step(tracer, phase, step, S_minus_1, S_2, v_0, v_2, alpha_n, beta_n, h_n, condition_1, S_n, fallback):
+    """Record one recurrence step; only called when a tracer is attached."""
+    branch = branch_taken(condition_1, v_2 > v_0, S_2 > S_minus_1)
+    tracer.record(phase, step, alpha_n, beta_n, h_n, condition_1, branch,
+                  guard_flags(v_0, v_2, alpha_n, beta_n, fallback), S_n)
+
 def determine_MAPE_list(actual: list, predicted: list) -> list:
-    logging.debug(f'actual: {actual}, len {len(actual)}')
-    logging.debug(f"predicted: {predicted}, len {len(predicted)}")
     min_len = min(len(actual), len(predicted))
     actual = actual[:min_len]
     predicted = predicted[:min_len]
@@ -92,8 +111,14 @@ def determine_MAPE_list(actual: list, predicted: list) -> list:
         mape_list.append(float(MAPE))
     return mape_list
 
-def fitting(closing_prices, stock_symbol):
-    logging.debug(f'fitting called with closing_prices={closing_prices}, stock_symbol={stock_symbol}')
+def fitting(closing_prices, stock_symbol, tracer=None):
+    """
+    Fit the recurrence to `closing_prices`.
+
+    `tracer` is an optional `tracer.StepTracer` that records per-step
+    diagnostics; without one the loop does no tracing work.
+    """
+    logging.debug(f'fitting {stock_symbol}: {len(closing_prices)} points')
     Fitting_S_n_list = []
     v_list = []
     first_run = True
@@ -121,6 +146,7 @@ def fitting(closing_prices, stock_symbol):
             first_run = False
         v_list.append(v_2)
 
+        fallback = False
         try:
             alpha_n = determine_alpha_n(S_minus_1,S_0, S_1, S_2)
             beta_n = determine_beta_n(S_minus_1,S_1, S_2, alpha_n)
@@ -130,15 +156,25 @@ def fitting(closing_prices, stock_symbol):
         except (ZeroDivisionError) as e:
             logging.warning(f"Error in calculation at index {i}: {e}. Using fallback.")
             S_n = S_2
+            alpha_n = beta_n = h_n = condition_1 = float('nan')
+            fallback = True
 
         Fitting_S_n_list.append(float(S_n))
-        logging.debug(f'Appended S_n={S_n} to Fitting_S_n_list')
+        if tracer is not None:
+            _trace_step(tracer, PHASE_FIT, i, S_minus_1, S_2, v_0, v_2, alpha_n, beta_n, h_n, condition_1,
+                        float(S_n), fallback)
     
     return Fitting_S_n_list, v_list
 
-def forecasting(Fitting_S_n_list, forecast_data, stock_symbol):
+def forecasting(Fitting_S_n_list, forecast_data, stock_symbol, detect_cycles=True, tracer=None):
     """
-    Updated forecasting function with proper date alignment
+    Updated forecasting function with proper date alignment.
+
+    Each step depends only on the previous four values, so once those four
+    values repeat exactly (a fixed point or a cycle) the remaining horizon
+    is filled by repeating the cycle instead of iterating. `detect_cycles`
+    turns this off. `tracer` records per-step diagnostics as in `fitting`;
+    steps filled from a detected cycle are not recorded.
     """
     if len(Fitting_S_n_list) < 4:
         st.error("Tidak cukup data fitting untuk melakukan forecasting.")
@@ -163,10 +199,23 @@ def forecasting(Fitting_S_n_list, forecast_data, stock_symbol):
 
     # Perform forecasting
     S_forecast_list = []
+    seen_states = {}
     
     for i in range(forecast_days):
         # Use the last 4 values for calculation
         if len(fitting_S_last) >= 4:
+            if detect_cycles:
+                state = tuple(fitting_S_last[-4:])
+                cycle_start = seen_states.get(state)
+                if cycle_start is not None:
+                    period = i - cycle_start
+                    for k in range(i, forecast_days):
+                        S_forecast_list.append(S_forecast_list[cycle_start + (k - cycle_start) % period])
+                    logging.info(f"Forecast repeats with period {period} from step {cycle_start}; "
+                                 f"filled {forecast_days - i} remaining steps")
+                    break
+                seen_states[state] = i
+            
             S_minus_1 = fitting_S_last[-4]
             S_0 = fitting_S_last[-3]
             S_1 = fitting_S_last[-2]
@@ -175,6 +224,7 @@ def forecasting(Fitting_S_n_list, forecast_data, stock_symbol):
             v_0 = determine_v_n(S_0, S_minus_1)
             v_2 = determine_v_n(S_2, S_1)
             
+            fallback = False
             try:
                 alpha_n = determine_alpha_n(S_minus_1, S_0, S_1, S_2)
                 beta_n = determine_beta_n(S_0, S_1, S_2, alpha_n)
@@ -184,13 +234,244 @@ def forecasting(Fitting_S_n_list, forecast_data, stock_symbol):
             except (ZeroDivisionError, Exception) as e:
                 logging.warning(f"Error in forecast at step {i}: {e}. Using previous value.")
                 S_n = S_2
+                alpha_n = beta_n = h_n = condition_1 = float('nan')
+                fallback = True
                 
             S_forecast_list.append(float(S_n))
             fitting_S_last.append(float(S_n))
+            if tracer is not None:
+                _trace_step(tracer, PHASE_FORECAST, i, S_minus_1, S_2, v_0, v_2, alpha_n, beta_n, h_n,
+                            condition_1, float(S_n), fallback)
         else:
             # Fallback if not enough data
             S_forecast_list.append(fitting_S_last[-1] if fitting_S_last else 0)
     
     logging.info(f"Generated {len(S_forecast_list)} forecast points")
     
-    return S_forecast_list, forecast_dates, actual_forecast_prices
\ No newline at end of file
+    return S_forecast_list, forecast_dates, actual_forecast_prices
+
+def _guard(x):
+    """Element-wise form of the `abs(x) < 1e-12 -> 1e-12` guards."""
+    return np.where(np.abs(x) < 1e-12, 1e-12, x)
+
+def _log_abs_ratio(exponent, k):
+    """
+    Element-wise log(|(exp(exponent) + k) / (1 + k)|).
+
+    Large exponents are evaluated in the log domain so they do not overflow
+    float64 where mpmath's unbounded exponent would not.
+    """
+    big = exponent > 700
+    direct = np.log(np.abs((np.exp(np.where(big, 0.0, exponent)) + k) / (1 + k)))
+    shifted = exponent + np.log(np.abs((1 + k * np.exp(-np.where(big, exponent, 0.0))) / (1 + k)))
+    return np.where(big, shifted, direct)
+
+def _select_branch(condition_1, condition_2, condition_3):
+    """
+    Index (0-7) of the `determine_s_n` branch taken for each element, in the
+    order the branches appear there, or -1 when `condition_1` is zero.
+    """
+    branch = np.where(condition_2, 0, 4) + np.where(condition_1 > 0, 0, 2) + np.where(condition_3, 0, 1)
+    return np.where((condition_1 > 0) | (condition_1 < 0), branch, -1)
+
+def _recurrence_step(S_minus_1, S_0, S_1, S_2, beta_base, return_guards=False):
+    """
+    Vectorized equivalent of one step of the `fitting`/`forecasting` loops.
+
+    `beta_base` is the first argument passed to `determine_beta_n`: `S_0` in
+    `forecasting` and `S_minus_1` in `fitting`. Returns the new values and
+    the branch index taken for each element, plus the `tracer` guard
+    bitmask of each element when `return_guards` is set.
+    """
+    v_0 = _guard(S_0 - S_minus_1)
+    v_2 = _guard(S_2 - S_1)
+
+    # determine_alpha_n
+    AA = S_1 - 2 * S_0 + S_minus_1
+    BB = S_1 - S_0
+    CC = S_2 - 2 * S_1 + S_0
+    DD = S_0 - S_minus_1
+    alpha_penyebut = BB * DD * (BB - DD)
+    alpha = np.where(np.abs(alpha_penyebut) < 1e-12, 1e-12, (AA * BB - CC * DD) / alpha_penyebut)
+
+    # determine_beta_n
+    beta_CC = S_2 - 2 * S_1 + beta_base
+    beta_BB = S_1 - beta_base
+    beta = np.where(np.abs(beta_BB) < 1e-12, 1e-12, (beta_CC - alpha * beta_BB ** 2) / beta_BB)
+
+    # determine_h_n
+    safe_alpha = _guard(alpha)
+    h = np.abs(v_0 + (beta / safe_alpha) / v_0)
+
+    # `alpha` can be exactly zero here; the scalar code then raises
+    # ZeroDivisionError and keeps S_2.
+    alpha_is_zero = alpha == 0
+    condition_1 = (v_2 + beta / np.where(alpha_is_zero, 1.0, alpha)) * v_2
+    # A zero alpha raises in the scalar code before any branch is taken
+    branch = np.where(alpha_is_zero, -1, _select_branch(condition_1, v_2 > v_0, S_2 > S_minus_1))
+    if return_guards:
+        # Same bits as `tracer.guard_flags`; a fallback step has no alpha or beta
+        guards = (np.where((np.abs(v_0) <= 1e-12) | (np.abs(v_2) <= 1e-12), GUARD_V, 0)
+                  | np.where(~alpha_is_zero & (np.abs(alpha) <= 1e-12), GUARD_ALPHA, 0)
+                  | np.where(~alpha_is_zero & (np.abs(beta) <= 1e-12), GUARD_BETA, 0)
+                  | np.where(alpha_is_zero, GUARD_FALLBACK, 0)).astype(np.uint8)
+
+    # determine_s_n
+    beta = _guard(beta)
+    inv_alpha = 1 / safe_alpha
+    beta_sign = np.sign(beta)
+    neg_abs_beta = -np.abs(beta)
+    log_minus = _log_abs_ratio(beta, -h)
+    log_plus = _log_abs_ratio(beta, h)
+    log_minus_neg = _log_abs_ratio(neg_abs_beta, -h)
+    log_plus_neg = _log_abs_ratio(neg_abs_beta, h)
+    candidates = [
+        S_minus_1 - inv_alpha * log_minus,
+        S_minus_1 + np.abs(inv_alpha) * beta_sign * log_minus,
+        S_minus_1 - inv_alpha * log_plus,
+        S_minus_1 - np.abs(inv_alpha) * beta_sign * log_plus,
+        S_minus_1 - inv_alpha * beta_sign * log_minus,
+        S_minus_1 - np.abs(inv_alpha) * log_minus_neg,
+        S_minus_1 + inv_alpha * beta_sign * log_plus_neg,
+        S_minus_1 + np.abs(inv_alpha) * log_plus_neg,
+    ]
+    S_n = np.choose(np.maximum(branch, 0), candidates)
+    S_n = np.where(branch < 0, S_2, S_n)
+
+    # Branches dividing by (1 - h) fall back to s1 in determine_s_n when h == 1.
+    S_n = np.where((h == 1) & (condition_1 > 0), S_minus_1, S_n)
+    # Any remaining non-finite value mirrors the scalar exception fallback.
+    S_n = np.where(~np.isfinite(S_n), S_2, S_n)
+    if return_guards:
+        return S_n, branch, guards
+    return S_n, branch
+
+def fitting_vectorized(closing_prices, return_branches=False):
+    """
+    Vectorized equivalent of `fitting`.
+
+    Each fitted value depends only on the four actual prices ending at it,
+    so the whole series is a single `_recurrence_step` call. Returns
+    `(Fitting_S_n_list, v_list)` like `fitting`, plus the branch index of
+    every fitted point (-1 for the three copied prices) when
+    `return_branches` is set.
+    """
+    prices = np.asarray(closing_prices, dtype=float)
+    if len(prices) < 4:
+        return ([], [], np.empty(0, dtype=int)) if return_branches else ([], [])
+    with np.errstate(all='ignore'):
+        S_n, branch = _recurrence_step(prices[:-3], prices[1:-2], prices[2:-1], prices[3:], prices[:-3])
+    Fitting_S_n_list = np.concatenate([prices[:3], S_n]).tolist()
+    v_list = _guard(np.diff(prices)).tolist()
+    if return_branches:
+        return Fitting_S_n_list, v_list, np.concatenate([np.full(3, -1), branch])
+    return Fitting_S_n_list, v_list
+
+def fitting_diagnostics(closing_prices):
+    """
+    Branch index and guard bitmask of every point `fitting` produces.
+
+    Computed in one vectorized step like `fitting_vectorized`; the three
+    copied prices get branch -1 and no guards.
+    """
+    prices = np.asarray(closing_prices, dtype=float)
+    if len(prices) < 4:
+        return np.empty(0, dtype=int), np.empty(0, dtype=np.uint8)
+    with np.errstate(all='ignore'):
+        _, branch, guards = _recurrence_step(prices[:-3], prices[1:-2], prices[2:-1], prices[3:], prices[:-3],
+                                             return_guards=True)
+    return np.concatenate([np.full(3, -1), branch]), np.concatenate([np.zeros(3, dtype=np.uint8), guards])
+
+def _fill_periodic(values, rows, position, period):
+    """Fill `values[rows, position + 1:]` by repeating the last `period` columns."""
+    remaining = values.shape[1] - position - 1
+    if remaining <= 0:
+        return
+    source = position + 1 - period + np.arange(remaining) % period
+    values[rows[:, None], position + 1 + np.arange(remaining)] = values[rows[:, None], source]
+
+def forecasting_batch(tails, horizon, detect_cycles=True, max_period=8, check_every=8):
+    """
+    Run the `forecasting` recurrence for many independent series at once.
+
+    `tails` is an (N, 4) array of starting values, oldest first (for example
+    the last four fitted values of N symbols, or of N forecast origins).
+    All N recurrences advance together with one vectorized step per horizon
+    day. Returns an (N, horizon) array of forecast values.
+
+    Every `check_every` steps, rows whose last four values exactly repeat
+    those `p <= max_period` steps earlier are filled by periodic extension
+    and dropped from the active set; the loop ends once no rows remain.
+    """
+    tails = np.array(tails, dtype=float)
+    if tails.ndim != 2 or tails.shape[1] != 4:
+        raise ValueError(f"tails must have shape (N, 4), got {tails.shape}")
+    horizon = max(int(horizon), 0)
+    # Columns 0-3 hold the tails, forecasts follow from column 4
+    values = np.empty((tails.shape[0], horizon + 4))
+    values[:, :4] = tails
+    active = np.arange(tails.shape[0])
+
+    S_minus_1, S_0, S_1, S_2 = tails.T
+    with np.errstate(all='ignore'):
+        for step in range(horizon):
+            position = step + 4
+            S_n, _ = _recurrence_step(S_minus_1, S_0, S_1, S_2, S_0)
+            values[active, position] = S_n
+            S_minus_1, S_0, S_1, S_2 = S_0, S_1, S_2, S_n
+
+            if not detect_cycles or (step + 1) % check_every or step + 1 == horizon:
+                continue
+            state = values[active, position - 3:position + 1]
+            settled = np.zeros(len(active), dtype=bool)
+            for period in range(1, min(max_period, position - 3) + 1):
+                repeats = ~settled & np.all(state == values[active, position - 3 - period:position + 1 - period], axis=1)
+                if repeats.any():
+                    _fill_periodic(values, active[repeats], position, period)
+                    settled |= repeats
+            if settled.any():
+                keep = ~settled
+                active = active[keep]
+                S_minus_1, S_0, S_1, S_2 = S_minus_1[keep], S_0[keep], S_1[keep], S_2[keep]
+                if not len(active):
+                    logging.info(f"All batched forecasts settled after {step + 1} of {horizon} steps")
+                    break
+
+    logging.info(f"Generated batched forecast of {horizon} steps for {tails.shape[0]} series")
+    return values[:, 4:]
+
+def forecasting_ensemble(Fitting_S_n_list, horizon, closing_prices=None, n_paths=1000,
+                         percentiles=(5, 25, 50, 75, 95), seed=None):
+    """
+    Monte Carlo ensemble around the deterministic forecast.
+
+    Each path starts from the last four fitted values plus a perturbation and
+    all paths run together through `forecasting_batch`. With `closing_prices`
+    the perturbations are fitting residuals resampled with replacement;
+    otherwise Gaussian noise scaled to the recent fitted moves is used.
+    Returns {percentile: array of length `horizon`}.
+    """
+    if len(Fitting_S_n_list) < 4 or horizon <= 0 or n_paths <= 0:
+        return {}
+
+    rng = np.random.default_rng(seed)
+    fitted = np.asarray(Fitting_S_n_list, dtype=float)
+    tail = fitted[-4:]
+
+    residuals = np.empty(0)
+    if closing_prices is not None:
+        n = min(len(closing_prices), len(fitted))
+        # The first three fitted values are copies of the actual prices.
+        residuals = np.asarray(closing_prices[3:n], dtype=float) - fitted[3:n]
+        residuals = residuals[np.isfinite(residuals)]
+
+    if residuals.size:
+        noise = rng.choice(residuals, size=(n_paths, 4), replace=True)
+    else:
+        scale = np.std(np.diff(fitted[-20:])) if len(fitted) > 4 else 0.0
+        noise = rng.normal(0.0, scale, size=(n_paths, 4))
+
+    paths = forecasting_batch(tail + noise, horizon)
+    with np.errstate(all='ignore'):
+        bands = np.nanpercentile(np.where(np.isfinite(paths), paths, np.nan), percentiles, axis=0)
+    return dict(zip(percentiles, bands))
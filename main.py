@@ -3,101 +3,112 @@ from datetime import datetime, timedelta
 import logging
 import numpy as np
 import pandas as pd
-from ui import create_ui
-from store import get_data_with_dates, filter_prices_duplicates
-from formula import fitting, forecasting, determine_MAPE_list
-from chart import plot_fitting, plot_fitting_forecast, plot_mape
-from export import create_excel_download
+from ui import create_ui, create_bundle_ui, bar_unit
+from store import ingest_data
+from formula import fitting, forecasting, forecasting_ensemble, determine_MAPE_list
+from chart import plot_fitting, plot_fitting_forecast, plot_mape, render_charts
+from export import excel_cache_key, get_excel_download, is_excel_ready, submit_excel_build, write_report_bundle
 from table import display_raw_data_table  
+from metrics import FIT_SECONDS, FORECAST_SECONDS, series_length_label, start_exporter, track_session, track_peak_rss
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from pipeline import AnalysisResult, analysis_cache_key, load_cached_result, single_flight, store_cached_result
+from tracer import StepTracer
+from analytics import fit_analytics
+import settings
+import io
 
 logging.basicConfig(
-    level=logging.DEBUG, 
+    level=getattr(logging, settings.LOG_LEVEL, logging.INFO),
     format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(message)s",
     handlers=[logging.StreamHandler()]
 )
 
+ENGINE_COLUMNS = ['Close']
+
 class StockFiltering:
     """Handles data filtering operations."""
     @staticmethod
-    def filter_data(fitting_data):
-        """Filter duplicates from fitting data."""
-        if fitting_data is None or fitting_data.empty:
-            st.error("No data to filter.")
-            return None, None
-        
-        if isinstance(fitting_data['Close'], pd.DataFrame):
-            st.error("Unexpected data structure: 'Close' column is a DataFrame.")
-            logging.error(f"fitting_data['Close'] is a DataFrame: {fitting_data['Close'].head()}")
-            return None, None
-        
-        filtered_data = filter_prices_duplicates(fitting_data)
-        if filtered_data.empty:
-            st.error("No data remains after filtering duplicates.")
-            return None, None
-        
-        fitting_prices = filtered_data['Close'].tolist()
-        fitting_dates = filtered_data.index.tolist()
-        return fitting_prices, fitting_dates
+    def filter_data(ingested):
+        """Validate the deduplicated fitting data and convert it for the engine."""
+        if len(ingested.fitting_prices) < 4:
+            st.error("Data tidak cukup untuk melakukan forecasting. "
+                     "Minimal 4 data point (setelah menghapus harga duplikat) diperlukan. "
+                     "Coba perpanjang periode fitting.")
+            return None
+        # The reference engine works on Python floats; convert once here
+        return ingested.fitting_prices.tolist(), ingested.fitting_dates.tolist()
 
 class StockDataFetcher:
     """Handles data fetching from Yahoo Finance."""
     @staticmethod
-    def fetch_data(stock_symbol, start_date, end_date, forecast_end_date):
-        """Fetch stock data for fitting and forecasting periods."""
+    def fetch_data(stock_symbol, start_date, end_date, forecast_end_date, resolution='daily'):
+        """Fetch, split and deduplicate stock data for fitting and forecasting periods."""
         with st.spinner("Mengambil dan memproses data..."):
-            fitting_data, forecast_data = get_data_with_dates(
-                stock_symbol, start_date, end_date, forecast_end_date
-            )
+            # In memory-budget mode only the columns the engine uses are kept
+            columns = ENGINE_COLUMNS if settings.MEMORY_BUDGET else None
+            # Sessions asking for the same data at the same time share one upstream fetch
+            key = ('ingest', stock_symbol, start_date, end_date, forecast_end_date, resolution,
+                   tuple(columns or ()))
+            ingested, _ = single_flight(key, lambda: ingest_data(
+                stock_symbol, start_date, end_date, forecast_end_date, columns=columns, resolution=resolution
+            ))
             
-            if fitting_data is None:
+            if ingested is None:
                 st.error(f"Tidak dapat mengambil data untuk simbol {stock_symbol}. "
                          f"Pastikan menggunakan simbol saham benar, untuk saham Indonesia "
                          f"dapat ditulis dengan format [simbol saham].JK "
                          f"(contoh: BBCA.JK untuk saham Bank Central Asia Tbk.)")
                 st.info("Silakan periksa simbol saham di Yahoo Finance atau coba simbol lain.")
-                return None, None, None, None
-            
-            if len(fitting_data) < 4:
-                st.error("Data tidak cukup untuk melakukan forecasting. "
-                         "Minimal 4 data point diperlukan. Coba perpanjang periode fitting.")
-                return None, None, None, None
-            
-            fitting_prices = fitting_data['Close'].tolist()
-            fitting_dates = fitting_data.index.tolist()
-            return fitting_data, forecast_data, fitting_prices, fitting_dates
+                return None
+            return ingested
 
 class StockFitting:
     """Handles stock price fitting operations."""
     @staticmethod
-    def perform_fitting(fitting_prices, stock_symbol):
+    def perform_fitting(fitting_prices, stock_symbol, tracer=None):
         """Perform fitting on stock prices."""
-        Fitting_S_n_list, v_list = fitting(fitting_prices, stock_symbol)
+        with FIT_SECONDS.time(length_le=series_length_label(len(fitting_prices))):
+            Fitting_S_n_list, v_list = fitting(fitting_prices, stock_symbol, tracer=tracer)
         if not Fitting_S_n_list:
-            st.error("Gagal melakukan fitting data.")
-            return None, None
+            return None
         mape_fit = determine_MAPE_list(fitting_prices, Fitting_S_n_list)
         return Fitting_S_n_list, v_list, mape_fit
 
 class StockForecasting:
     """Handles stock price forecasting operations."""
     @staticmethod
-    def perform_forecasting(Fitting_S_n_list, forecast_data, stock_symbol):
+    def perform_forecasting(Fitting_S_n_list, forecast_data, stock_symbol, tracer=None):
         """Perform forecasting based on fitting results."""
-        S_forecast, forecast_dates, actual_forecast_prices = forecasting(
-            Fitting_S_n_list, forecast_data, stock_symbol
-        )
+        if forecast_data is None or forecast_data.empty:
+            # Nothing to forecast; the caller shows the warning in its own session
+            return [], [], [], []
+        horizon = len(forecast_data)
+        with FORECAST_SECONDS.time(length_le=series_length_label(horizon)):
+            S_forecast, forecast_dates, actual_forecast_prices = forecasting(
+                Fitting_S_n_list, forecast_data, stock_symbol, tracer=tracer
+            )
         mape_forecast = []
         if S_forecast and actual_forecast_prices:
             mape_forecast = determine_MAPE_list(actual_forecast_prices, S_forecast)
         return S_forecast, forecast_dates, actual_forecast_prices, mape_forecast
 
+    @staticmethod
+    def perform_ensemble(Fitting_S_n_list, fitting_prices, horizon, n_paths):
+        """Compute Monte Carlo percentile bands around the forecast."""
+        if not n_paths or horizon <= 0:
+            return None
+        with st.spinner("Menjalankan simulasi ensemble..."):
+            return forecasting_ensemble(Fitting_S_n_list, horizon, closing_prices=fitting_prices,
+                                        n_paths=int(n_paths))
+
 class StockVisualizer:
     """Handles visualization of fitting and forecasting results."""
     @staticmethod
     def display_results(stock_symbol, fitting_data, forecast_data, start_date, end_date, 
                        forecast_end_date, fitting_prices, fitting_dates, Fitting_S_n_list, 
                        S_forecast, forecast_dates, actual_forecast_prices, mape_fit, mape_forecast,
-                       input_forecast_days): 
+                       input_forecast_days, forecast_bands=None, resolution='daily', interactive=False,
+                       preview=False): 
         """Display all results including tables and charts."""
         st.success("Selesai!")
 
@@ -120,59 +131,129 @@ class StockVisualizer:
                     st.metric("MAPE Forecast", f"{np.mean(mape_forecast):.2f}%")
             with col4:
                 forecast_days_actual = len(S_forecast) if S_forecast else 0
-                st.metric("Periode Forecast", f"{forecast_days_actual} hari")
+                st.metric("Periode Forecast", f"{forecast_days_actual} {bar_unit(resolution)}")
 
             # Display warning if forecast period is limited
             if input_forecast_days > forecast_days_actual and forecast_days_actual == 268:
                 st.warning(
-                    f"⚠️ Catatan: Periode forecast yang diminta ({input_forecast_days} hari) "
-                    f"telah dibatasi menjadi {forecast_days_actual} hari untuk menjaga efisiensi "
+                    f"⚠️ Catatan: Periode forecast yang diminta ({input_forecast_days} {bar_unit(resolution)}) "
+                    f"telah dibatasi menjadi {forecast_days_actual} {bar_unit(resolution)} untuk menjaga efisiensi "
                     f"perhitungan dan akurasi forecasting."
                 )
 
+            # Render all static charts in one figure pass
+            images = {}
+            if not interactive:
+                images = render_charts(
+                    stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list,
+                    forecast_dates, S_forecast, actual_forecast_prices, mape_fit, mape_forecast,
+                    forecast_bands=forecast_bands, preview=preview
+                )
+
             # Plot charts
-            plot_fitting(stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list)
+            plot_fitting(stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list, interactive=interactive,
+                         image=images.get('fit'))
             
             if S_forecast and actual_forecast_prices:
                 plot_fitting_forecast(
                     stock_symbol, 
                     fitting_dates, fitting_prices, Fitting_S_n_list,
-                    forecast_dates, S_forecast, actual_forecast_prices
+                    forecast_dates, S_forecast, actual_forecast_prices,
+                    forecast_bands=forecast_bands,
+                    interactive=interactive,
+                    image=images.get('forecast')
                 )
             
             if mape_fit:
-                plot_mape(stock_symbol, mape_fit, "Fitting", np.mean(mape_fit))
+                plot_mape(stock_symbol, mape_fit, "Fitting", np.mean(mape_fit), interactive=interactive,
+                          image=images.get('mape_Fitting'))
             
             if mape_forecast:
-                plot_mape(stock_symbol, mape_forecast, "Forecast", np.mean(mape_forecast))
+                plot_mape(stock_symbol, mape_forecast, "Forecast", np.mean(mape_forecast), interactive=interactive,
+                          image=images.get('mape_Forecast'))
+
+    @staticmethod
+    def display_trace(tracer):
+        """Show the step tracer summary and records."""
+        with st.expander("🔍 Step Trace"):
+            summary = tracer.summary()
+            st.caption(f"{summary['records']} langkah tercatat (setiap {summary['sample_every']} langkah, "
+                       f"{summary['dropped']} terlama dibuang)")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.dataframe(pd.DataFrame(summary['branch_counts'].items(), columns=['Branch', 'Count']),
+                             hide_index=True, use_container_width=True)
+            with col2:
+                st.dataframe(pd.DataFrame(summary['guard_rates'].items(), columns=['Guard', 'Rate']),
+                             hide_index=True, use_container_width=True)
+            st.dataframe(tracer.to_frame(), hide_index=True, use_container_width=True)
+
+    @staticmethod
+    def display_analytics(analytics):
+        """Show residual, rolling error, branch and guard analytics of the fit."""
+        with st.expander("📐 Analitik Residual Fitting"):
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("RMSE", f"{analytics.rmse:.4f}")
+            with col2:
+                st.metric("MAE", f"{analytics.mae:.4f}")
+            with col3:
+                st.metric("MAPE per Titik", f"{analytics.mape:.2f}%",
+                          help="Rata-rata APE tiap titik fitting, bukan rata-rata MAPE berjalan pada MAPE Fitting.")
+            with col4:
+                st.metric("Akurasi Arah", f"{analytics.direction_accuracy:.1f}%")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.dataframe(pd.DataFrame(analytics.branch_counts.items(), columns=['Branch', 'Count']),
+                             hide_index=True, use_container_width=True)
+            with col2:
+                st.dataframe(pd.DataFrame(analytics.guard_rates.items(), columns=['Guard', 'Rate']),
+                             hide_index=True, use_container_width=True)
+            st.caption(f"Rolling window: {', '.join(str(w) for w in analytics.windows)} titik")
+            st.dataframe(analytics.points, hide_index=True, use_container_width=True)
 
 class StockExporter:
     """Handles exporting analysis results to Excel."""
     @staticmethod
     def export_to_excel(stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list, 
-                        forecast_dates, S_forecast, actual_forecast_prices, start_date, forecast_end_date):
-        """Create and provide Excel download for analysis results."""
+                        forecast_dates, S_forecast, actual_forecast_prices, start_date, forecast_end_date,
+                        analytics=None):
+        """Offer an Excel download for analysis results, built only when requested."""
         st.subheader("💾 Download Data")
+        export_kwargs = dict(
+            stock_symbol=stock_symbol,
+            fitting_dates=fitting_dates,
+            fitting_prices=fitting_prices,
+            Fitting_S_n_list=Fitting_S_n_list,
+            forecast_dates=forecast_dates if forecast_dates else [],
+            S_forecast=S_forecast if S_forecast else [],
+            actual_forecast_prices=actual_forecast_prices if actual_forecast_prices else [],
+            analytics=analytics
+        )
+        key = excel_cache_key(**export_kwargs)
+        if settings.EXCEL_PREBUILD:
+            submit_excel_build(key, export_kwargs)
+        StockExporter.download_fragment(stock_symbol, key, export_kwargs, start_date, forecast_end_date)
+
+    @staticmethod
+    @st.fragment
+    def download_fragment(stock_symbol, key, export_kwargs, start_date, forecast_end_date):
+        """Build the workbook on demand; reruns only this fragment, not the analysis."""
         try:
-            excel_data = create_excel_download(
-                stock_symbol=stock_symbol,
-                fitting_dates=fitting_dates,
-                fitting_prices=fitting_prices,
-                Fitting_S_n_list=Fitting_S_n_list,
-                forecast_dates=forecast_dates if forecast_dates else [],
-                S_forecast=S_forecast if S_forecast else [],
-                actual_forecast_prices=actual_forecast_prices if actual_forecast_prices else []
-            )
-            
-            filename = f"{stock_symbol}_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-            st.download_button(
-                label="📥 Download Excel Report",
-                data=excel_data,
-                file_name=filename,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                help="Download complete analysis data in Excel format"
-            )
+            if is_excel_ready(key) or st.button("📄 Siapkan Excel Report", help="Buat file Excel untuk diunduh"):
+                with st.spinner("Membuat file Excel..."):
+                    excel_data = get_excel_download(key, export_kwargs)
+                
+                filename = f"{stock_symbol}_analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+                
+                st.download_button(
+                    label="📥 Download Excel Report",
+                    data=excel_data,
+                    file_name=filename,
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    help="Download complete analysis data in Excel format",
+                    on_click="ignore"
+                )
             
             st.info(f"📊 File akan berisi data dari {start_date} hingga {forecast_end_date}")
             
@@ -180,11 +261,36 @@ class StockExporter:
             st.error(f"Error creating Excel file: {str(e)}")
             logging.error(f"Excel creation error: {e}")
 
+class StockBundleExporter:
+    """Handles multi-symbol report bundles."""
+    @staticmethod
+    def export_bundle(stock_symbols, start_date, end_date, forecast_end_date, resolution='daily'):
+        """Build per-symbol workbooks in parallel and offer them as one ZIP download."""
+        if not stock_symbols:
+            st.error("Masukkan minimal satu simbol saham.")
+            return
+        # st.download_button keeps the whole payload in memory anyway
+        bundle_file = io.BytesIO()
+        with st.spinner(f"Membuat laporan untuk {len(stock_symbols)} simbol..."):
+            summary_rows = write_report_bundle(stock_symbols, start_date, end_date, forecast_end_date, bundle_file,
+                                               resolution=resolution)
+        
+        st.dataframe(pd.DataFrame(summary_rows).sort_values('Symbol'), use_container_width=True, hide_index=True)
+        filename = f"watchlist_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        st.download_button(
+            label="📥 Download Report Bundle",
+            data=bundle_file.getvalue(),
+            file_name=filename,
+            mime="application/zip",
+            on_click="ignore"
+        )
+
 class StockForecaster:
     def __init__(self):
         """Initialize the StockForecaster with UI inputs."""
         self.stock_symbol, self.start_date, self.training_days, self.forecast_days, \
-        self.end_date, self.forecast_end_date = create_ui()
+        self.end_date, self.forecast_end_date, self.ensemble_paths, self.resolution, \
+        self.interactive_charts, self.chart_preview = create_ui()
         self.today = datetime.today().date()
         self.max_fitting_date = self.today - timedelta(days=2)
 
@@ -203,74 +309,176 @@ class StockForecaster:
             return False
         return True
     
+    def compute_result(self, cache_key, fitting_prices, fitting_dates, forecast_data, tracer=None):
+        """
+        Fit and forecast, or load them from the shared result cache.
+
+        Touches no page elements, so the result can be handed to other
+        sessions waiting on the same request. Returns an `AnalysisResult`,
+        or None when fitting fails.
+        """
+        if tracer is None:
+            cached = load_cached_result(cache_key, self.stock_symbol)
+            if cached is not None:
+                return cached
+
+        # Perform fitting
+        fitter = StockFitting()
+        fitting_result = fitter.perform_fitting(fitting_prices, self.stock_symbol, tracer)
+        if fitting_result is None:
+            return None
+        Fitting_S_n_list, v_list, mape_fit = fitting_result
+
+        # Perform forecasting
+        forecaster = StockForecasting()
+        S_forecast, forecast_dates, actual_forecast_prices, mape_forecast = forecaster.perform_forecasting(
+            Fitting_S_n_list, forecast_data, self.stock_symbol, tracer
+        )
+        result = AnalysisResult(
+            stock_symbol=self.stock_symbol,
+            fitting_dates=fitting_dates,
+            fitting_prices=fitting_prices,
+            Fitting_S_n_list=Fitting_S_n_list,
+            v_list=v_list,
+            mape_fit=mape_fit,
+            forecast_dates=forecast_dates,
+            S_forecast=S_forecast,
+            actual_forecast_prices=actual_forecast_prices,
+            mape_forecast=mape_forecast,
+        )
+        store_cached_result(cache_key, result)
+        return result
+
+    def run_analysis(self):
+        """Fetch, fit, forecast and display results for the current inputs."""
+        try:
+            # Validate inputs
+            if not self.validate_inputs():
+                return
+
+            # Fetch data
+            fetcher = StockDataFetcher()
+            ingested = fetcher.fetch_data(
+                self.stock_symbol, self.start_date, self.end_date, self.forecast_end_date, self.resolution
+            )
+            if ingested is None:
+                return
+            fitting_data, forecast_data = ingested.fitting_data, ingested.forecast_data
+
+            # Validate the deduplicated data
+            filterer = StockFiltering()
+            filtered_result = filterer.filter_data(ingested)
+            if filtered_result is None:
+                return
+            fitting_prices, fitting_dates = filtered_result
+
+            # Serve fit and forecast from the shared result cache when another
+            # session or process has already computed them
+            cache_key = analysis_cache_key(
+                self.stock_symbol, self.start_date, self.end_date, self.forecast_end_date, ingested,
+                self.resolution
+            )
+            # A traced run has to recompute to fill the tracer
+            tracer = None
+            if settings.TRACE_STEPS:
+                tracer = StepTracer(settings.TRACE_CAPACITY, settings.TRACE_SAMPLE_EVERY)
+            if tracer is None:
+                # Identical requests from other sessions wait for this one and share its result
+                result, shared = single_flight(cache_key, lambda: self.compute_result(
+                    cache_key, fitting_prices, fitting_dates, forecast_data
+                ))
+                if shared:
+                    logging.info(f"Shared in-flight result for {self.stock_symbol}")
+            else:
+                result = self.compute_result(cache_key, fitting_prices, fitting_dates, forecast_data, tracer)
+            if result is None:
+                st.error("Gagal melakukan fitting data.")
+                return
+            if forecast_data is None or forecast_data.empty:
+                st.warning("Tidak ada data forecast yang tersedia.")
+            Fitting_S_n_list, v_list, mape_fit = result.Fitting_S_n_list, result.v_list, result.mape_fit
+            S_forecast, forecast_dates = result.S_forecast, result.forecast_dates
+            actual_forecast_prices, mape_forecast = result.actual_forecast_prices, result.mape_forecast
+
+            forecast_bands = None
+            if S_forecast:
+                forecast_bands = StockForecasting.perform_ensemble(
+                    Fitting_S_n_list, fitting_prices, len(S_forecast), self.ensemble_paths
+                )
+
+            # Display results
+            visualizer = StockVisualizer()
+            visualizer.display_results(
+                self.stock_symbol, fitting_data, forecast_data, self.start_date, 
+                self.end_date, self.forecast_end_date, fitting_prices, fitting_dates, 
+                Fitting_S_n_list, S_forecast, forecast_dates, actual_forecast_prices, 
+                mape_fit, mape_forecast,
+                self.forecast_days,
+                forecast_bands,
+                self.resolution,
+                self.interactive_charts,
+                self.chart_preview
+            )
+            analytics = fit_analytics(fitting_dates, fitting_prices, Fitting_S_n_list, v_list)
+            if analytics is not None:
+                visualizer.display_analytics(analytics)
+            if tracer is not None:
+                visualizer.display_trace(tracer)
+            # The raw frames are not needed past the raw data table
+            del fitting_data, forecast_data, ingested
+
+            # Export to Excel
+            exporter = StockExporter()
+            exporter.export_to_excel(
+                self.stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list, 
+                forecast_dates, S_forecast, actual_forecast_prices, 
+                self.start_date, self.forecast_end_date,
+                analytics
+            )
+
+        except ValueError as ve:
+            st.error(str(ve))
+            st.info("Silakan periksa simbol saham di Yahoo Finance atau coba simbol lain.")
+        except Exception as e:
+            st.error(f"Terjadi kesalahan: {str(e)}")
+            logging.error(f"Main execution error: {e}")
+            st.info("Silakan coba dengan parameter yang berbeda atau periksa koneksi data.")
+
     def run(self):
         """Main method to run the forecasting application."""
         run_forecast = st.button("🔗 Submit Data", use_container_width=True, type="primary")
 
         if run_forecast:
-            try:
-                # Validate inputs
-                if not self.validate_inputs():
-                    return
-
-                # Fetch data
-                fetcher = StockDataFetcher()
-                data_result = fetcher.fetch_data(
-                    self.stock_symbol, self.start_date, self.end_date, self.forecast_end_date
-                )
-                if data_result is None:
-                    return
-                fitting_data, forecast_data, fitting_prices, fitting_dates = data_result
-
-                # Filter data
-                filterer = StockFiltering()
-                filtered_result = filterer.filter_data(fitting_data)
-                if filtered_result is None:
-                    return
-                fitting_prices, fitting_dates = filtered_result
-
-                # Perform fitting
-                fitter = StockFitting()
-                fitting_result = fitter.perform_fitting(fitting_prices, self.stock_symbol)
-                if fitting_result is None:
-                    return
-                Fitting_S_n_list, v_list, mape_fit = fitting_result
-
-                # Perform forecasting
-                forecaster = StockForecasting()
-                forecast_result = forecaster.perform_forecasting(
-                    Fitting_S_n_list, forecast_data, self.stock_symbol
-                )
-                S_forecast, forecast_dates, actual_forecast_prices, mape_forecast = forecast_result
-
-                # Display results
-                visualizer = StockVisualizer()
-                visualizer.display_results(
-                    self.stock_symbol, fitting_data, forecast_data, self.start_date, 
-                    self.end_date, self.forecast_end_date, fitting_prices, fitting_dates, 
-                    Fitting_S_n_list, S_forecast, forecast_dates, actual_forecast_prices, 
-                    mape_fit, mape_forecast,
-                    self.forecast_days 
-                )
+            mode = "budget" if settings.MEMORY_BUDGET else "default"
+            with track_peak_rss(mode) as usage:
+                self.run_analysis()
+            if not usage['lifetime']:
+                logging.info(f"Run peak RSS: {usage['peak'] / 2**20:.1f} MB (start {usage['start'] / 2**20:.1f} MB)")
+                if settings.MEMORY_BUDGET:
+                    st.caption(f"🧠 Peak RSS selama run: {usage['peak'] / 2**20:.0f} MB "
+                               f"(awal {usage['start'] / 2**20:.0f} MB)")
+            elif usage['peak'] is not None:
+                # Without /proc only the lifetime peak of the process is known
+                logging.info(f"Process lifetime peak RSS: {usage['peak'] / 2**20:.1f} MB")
+                if settings.MEMORY_BUDGET:
+                    st.caption(f"🧠 Peak RSS proses sejak dimulai: {usage['peak'] / 2**20:.0f} MB")
 
-                # Export to Excel
-                exporter = StockExporter()
-                exporter.export_to_excel(
-                    self.stock_symbol, fitting_dates, fitting_prices, Fitting_S_n_list, 
-                    forecast_dates, S_forecast, actual_forecast_prices, 
-                    self.start_date, self.forecast_end_date
+        bundle_symbols, run_bundle = create_bundle_ui()
+        if run_bundle and self.validate_inputs():
+            try:
+                StockBundleExporter().export_bundle(
+                    bundle_symbols, self.start_date, self.end_date, self.forecast_end_date, self.resolution
                 )
-
-            except ValueError as ve:
-                st.error(str(ve))
-                st.info("Silakan periksa simbol saham di Yahoo Finance atau coba simbol lain.")
             except Exception as e:
-                st.error(f"Terjadi kesalahan: {str(e)}")
-                logging.error(f"Main execution error: {e}")
-                st.info("Silakan coba dengan parameter yang berbeda atau periksa koneksi data.")
+                st.error(f"Error creating report bundle: {str(e)}")
+                logging.error(f"Report bundle error: {e}")
 
 def main():
     """Entry point for the application."""
+    start_exporter()
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        track_session(ctx.session_id)
     forecaster = StockForecaster()
     forecaster.run()
 
@@ -0,0 +1,363 @@
+import atexit
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 5e6, 1e7, 5e7)
+LENGTH_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class _Metric:
+    """Base class for metrics keyed by a fixed set of label names."""
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self):
+        """Yield (sample name, label string, value) tuples."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, self._labels(key), value
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def values(self):
+        """Return a snapshot of {label tuple: value}."""
+        with self._lock:
+            return dict(self._values)
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed when scraped."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Compute the gauge at scrape time; `function` returns {label tuple: value}."""
+        self._function = function
+
+    def samples(self):
+        if self._function is None:
+            yield from super().samples()
+            return
+        for key, value in self._function().items():
+            yield self.name, self._labels(key), value
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the enclosed block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", self._labels(key, [("le", _format_value(bound))]), cumulative
+            yield f"{self.name}_sum", self._labels(key), total
+            yield f"{self.name}_count", self._labels(key), count
+
+class MetricsRegistry:
+    """Process-wide collection of metrics rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}.")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_to_file(self, path):
+        """Atomically write the rendered metrics to `path`."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(self.render())
+        os.replace(tmp_path, path)
+
+REGISTRY = MetricsRegistry()
+
+FETCH_SECONDS = REGISTRY.histogram(
+    "stocks_fetch_duration_seconds", "Latency of market data requests.", ["source", "endpoint"])
+FETCH_FAILURES = REGISTRY.counter(
+    "stocks_fetch_failures_total", "Market data requests that failed or returned no data.",
+    ["source", "endpoint", "reason"])
+CACHE_REQUESTS = REGISTRY.counter(
+    "stocks_cache_requests_total", "Cache lookups by cache name and result (hit or miss).", ["cache", "result"])
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "stocks_cache_hit_ratio", "Hit ratio of each cache since process start.", ["cache"])
+FIT_SECONDS = REGISTRY.histogram(
+    "stocks_fit_duration_seconds", "Duration of fitting, by series length bucket.", ["length_le"])
+FORECAST_SECONDS = REGISTRY.histogram(
+    "stocks_forecast_duration_seconds", "Duration of forecasting, by horizon length bucket.", ["length_le"])
+EXPORT_SECONDS = REGISTRY.histogram(
+    "stocks_export_duration_seconds", "Time spent generating export files.", ["format"])
+EXPORT_BYTES = REGISTRY.histogram(
+    "stocks_export_size_bytes", "Size of generated export files.", ["format"], buckets=SIZE_BUCKETS)
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "stocks_active_sessions", "Browser sessions seen within the session TTL.")
+RUN_PEAK_RSS = REGISTRY.histogram(
+    "stocks_run_peak_rss_bytes", "Peak resident set size of the process during a run.", ["mode"],
+    buckets=(64e6, 128e6, 256e6, 512e6, 768e6, 1024e6, 1536e6, 2048e6, 4096e6))
+
+def series_length_label(length):
+    """Map a series length to the upper bound of its length bucket."""
+    index = bisect.bisect_left(LENGTH_BUCKETS, length)
+    if index == len(LENGTH_BUCKETS):
+        return "+Inf"
+    return str(LENGTH_BUCKETS[index])
+
+def record_cache(cache, hit):
+    """Count a cache lookup for the hit ratio."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def _cache_hit_ratio():
+    totals = {}
+    for (cache, result), value in CACHE_REQUESTS.values().items():
+        hits, lookups = totals.get(cache, (0.0, 0.0))
+        if result == "hit":
+            hits += value
+        totals[cache] = (hits, lookups + value)
+    return {(cache,): hits / lookups for cache, (hits, lookups) in totals.items() if lookups}
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratio)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def lifetime_peak_rss():
+    """Peak resident set size since the process started, in bytes (None on Windows)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+@contextmanager
+def track_peak_rss(mode, interval=0.01):
+    """
+    Sample the process RSS while the block runs and record its peak.
+
+    Yields a dict whose 'start' and 'peak' entries are filled in (bytes).
+    RSS is process-wide, so concurrent sessions in the same replica count
+    towards each other's peaks. Where the current RSS cannot be read (no
+    /proc, e.g. macOS), 'start' is None, 'peak' is the process lifetime
+    peak, 'lifetime' is True and nothing is recorded in the histogram.
+    """
+    start = current_rss()
+    if start is None:
+        usage = {'start': None, 'peak': None, 'lifetime': True}
+        try:
+            yield usage
+        finally:
+            usage['peak'] = lifetime_peak_rss()
+        return
+
+    usage = {'start': start, 'peak': start, 'lifetime': False}
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(interval):
+            usage['peak'] = max(usage['peak'], current_rss() or 0)
+
+    sampler = threading.Thread(target=sample, name="rss-sampler", daemon=True)
+    sampler.start()
+    try:
+        yield usage
+    finally:
+        stop.set()
+        sampler.join()
+        usage['peak'] = max(usage['peak'], current_rss() or 0)
+        RUN_PEAK_RSS.observe(usage['peak'], mode=mode)
+
+_sessions_lock = threading.Lock()
+_sessions = {}
+
+def track_session(session_id):
+    """Mark a browser session as active."""
+    with _sessions_lock:
+        _sessions[session_id] = time.monotonic()
+
+def _active_sessions():
+    cutoff = time.monotonic() - settings.SESSION_TTL_SECONDS
+    with _sessions_lock:
+        for session_id in [sid for sid, seen in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        return {(): len(_sessions)}
+
+ACTIVE_SESSIONS.set_function(_active_sessions)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"metrics endpoint: {format % args}")
+
+_exporter_lock = threading.Lock()
+_exporter_started = False
+
+def _file_writer(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            REGISTRY.write_to_file(path)
+        except OSError as e:
+            logging.error(f"Failed to write metrics to {path}: {e}")
+
+def start_exporter():
+    """
+    Start the configured exporters once per process: an HTTP endpoint serving
+    /metrics and/or a file rewritten periodically.
+    """
+    global _exporter_started
+    with _exporter_lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    if settings.METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", settings.METRICS_PORT), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            logging.info(f"Serving metrics on port {settings.METRICS_PORT}")
+        except OSError as e:
+            logging.error(f"Could not start metrics endpoint on port {settings.METRICS_PORT}: {e}")
+
+    if settings.METRICS_FILE:
+        path = settings.METRICS_FILE.format(pid=os.getpid())
+        threading.Thread(target=_file_writer, args=(path, settings.METRICS_FILE_INTERVAL),
+                         name="metrics-file", daemon=True).start()
+        atexit.register(REGISTRY.write_to_file, path)
+        logging.info(f"Writing metrics to {path} every {settings.METRICS_FILE_INTERVAL}s")
@@ -0,0 +1,180 @@
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from store import ingest_data
+from formula import ENGINE_VERSION, fitting, forecasting, determine_MAPE_list
+from metrics import FIT_SECONDS, FORECAST_SECONDS, record_cache, series_length_label
+from result_cache import get_result_cache, make_cache_key
+
+@dataclass(frozen=True)
+class AnalysisResult:
+    """Fitting and forecasting output for one symbol and date range."""
+    stock_symbol: str
+    fitting_dates: list
+    fitting_prices: list
+    Fitting_S_n_list: list
+    v_list: list
+    mape_fit: list
+    forecast_dates: list = field(default_factory=list)
+    S_forecast: list = field(default_factory=list)
+    actual_forecast_prices: list = field(default_factory=list)
+    mape_forecast: list = field(default_factory=list)
+    # Optional `tracer.StepTracer` with per-step diagnostics; never cached
+    trace: object = field(default=None, compare=False, repr=False)
+
+    @property
+    def mean_mape_fit(self):
+        return float(np.mean(self.mape_fit)) if self.mape_fit else None
+
+    @property
+    def mean_mape_forecast(self):
+        return float(np.mean(self.mape_forecast)) if self.mape_forecast else None
+
+_DATE_FIELDS = ('fitting_dates', 'forecast_dates')
+_VALUE_FIELDS = ('fitting_prices', 'Fitting_S_n_list', 'v_list', 'mape_fit',
+                 'S_forecast', 'actual_forecast_prices', 'mape_forecast')
+
+def analysis_cache_key(stock_symbol, start_date, end_date, forecast_end_date, ingested, resolution='daily',
+                       **options):
+    """
+    Result cache key for one request; `options` are the filtering/engine
+    options in effect. The fingerprint of the `ingested` data is part of the
+    key, so a range whose forecast window was still open is recomputed once
+    new bars arrive.
+    """
+    return make_cache_key(stock_symbol, start_date, end_date, forecast_end_date, data=ingested.fingerprint,
+                          engine=ENGINE_VERSION, filter_duplicates=True, resolution=resolution, **options)
+
+def load_cached_result(key, stock_symbol):
+    """Return the cached `AnalysisResult` for `key`, or None."""
+    cache = get_result_cache()
+    arrays = cache.get(key) if cache is not None else None
+    record_cache("results", arrays is not None)
+    if arrays is None:
+        return None
+    values = {name: arrays[name].tolist() for name in _VALUE_FIELDS}
+    dates = {name: pd.to_datetime(arrays[name]).tolist() for name in _DATE_FIELDS}
+    return AnalysisResult(stock_symbol=stock_symbol, **values, **dates)
+
+def store_cached_result(key, result):
+    """Save `result` in the shared result cache."""
+    cache = get_result_cache()
+    if cache is None:
+        return
+    arrays = {name: np.asarray(getattr(result, name), dtype=float) for name in _VALUE_FIELDS}
+    for name in _DATE_FIELDS:
+        arrays[name] = pd.DatetimeIndex(getattr(result, name)).asi8
+    cache.put(key, result.stock_symbol, arrays)
+
+_inflight_lock = threading.Lock()
+_inflight = {}
+
+class _LeaderInterrupted(Exception):
+    """The leading caller left `compute` through a control-flow exception."""
+
+def single_flight(key, compute):
+    """
+    Run `compute()` once for concurrent callers with the same `key`.
+
+    The first caller computes in its own thread; callers arriving while it
+    runs wait for it and receive the same result object (or exception), so
+    the result must be treated as read-only. Exceptions that are not
+    `Exception`s (Streamlit's rerun/stop, KeyboardInterrupt) belong to the
+    leader's thread and are only raised there; waiters then retry and one
+    of them computes. Returns `(result, shared)` where `shared` is True for
+    callers that waited.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    record_cache("inflight", not leader)
+    if not leader:
+        try:
+            return future.result(), True
+        except _LeaderInterrupted:
+            return single_flight(key, compute)
+
+    try:
+        result = compute()
+    except BaseException as e:
+        _release(key)
+        future.set_exception(e if isinstance(e, Exception) else _LeaderInterrupted())
+        raise
+    _release(key)
+    future.set_result(result)
+    return result, False
+
+def _release(key):
+    # Removed before the future resolves, so a retrying waiter never finds the
+    # finished entry; later requests go through the result cache instead
+    with _inflight_lock:
+        _inflight.pop(key, None)
+
+def run_analysis(stock_symbol, start_date, end_date, forecast_end_date, provider=None, use_cache=True,
+                 refresh=False, tracer=None, resolution='daily'):
+    """
+    Fetch, filter, fit and forecast one symbol without any UI.
+
+    Returns an `AnalysisResult`, or None when there is not enough data.
+    Invalid symbols raise ValueError as in `store.get_data_with_dates`. The
+    data is always ingested (through the provider's price cache); results
+    for the same data are served from and saved to the shared result
+    cache, and `refresh` recomputes and overwrites the cached result. A
+    `tracer` is filled by the fit and forecast and attached as
+    `result.trace`, so it always recomputes. `resolution` ('daily',
+    'weekly' or 'monthly') sets the bar size of both the fit and the
+    forecast horizon.
+    """
+    ingested = ingest_data(
+        stock_symbol, start_date, end_date, forecast_end_date, provider=provider, resolution=resolution
+    )
+    if ingested is None or len(ingested.fitting_prices) < 4:
+        logging.error(f"Not enough data to analyse {stock_symbol} after filtering duplicates")
+        return None
+
+    key = analysis_cache_key(stock_symbol, start_date, end_date, forecast_end_date, ingested, resolution)
+    if use_cache and not refresh and tracer is None:
+        cached = load_cached_result(key, stock_symbol)
+        if cached is not None:
+            return cached
+    forecast_data = ingested.forecast_data
+    # The reference engine works on Python floats; convert once here
+    fitting_prices = ingested.fitting_prices.tolist()
+    fitting_dates = ingested.fitting_dates.tolist()
+
+    with FIT_SECONDS.time(length_le=series_length_label(len(fitting_prices))):
+        Fitting_S_n_list, v_list = fitting(fitting_prices, stock_symbol, tracer=tracer)
+    if not Fitting_S_n_list:
+        return None
+    mape_fit = determine_MAPE_list(fitting_prices, Fitting_S_n_list)
+
+    horizon = len(forecast_data) if forecast_data is not None else 0
+    with FORECAST_SECONDS.time(length_le=series_length_label(horizon)):
+        S_forecast, forecast_dates, actual_forecast_prices = forecasting(
+            Fitting_S_n_list, forecast_data, stock_symbol, tracer=tracer
+        )
+    mape_forecast = []
+    if S_forecast and actual_forecast_prices:
+        mape_forecast = determine_MAPE_list(actual_forecast_prices, S_forecast)
+
+    result = AnalysisResult(
+        stock_symbol=stock_symbol,
+        fitting_dates=fitting_dates,
+        fitting_prices=fitting_prices,
+        Fitting_S_n_list=Fitting_S_n_list,
+        v_list=v_list,
+        mape_fit=mape_fit,
+        forecast_dates=forecast_dates,
+        S_forecast=S_forecast,
+        actual_forecast_prices=actual_forecast_prices,
+        mape_forecast=mape_forecast,
+        trace=tracer,
+    )
+    if use_cache:
+        store_cached_result(key, result)
+    return result
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from io import BytesIO
+import numpy as np
+import peewee
+import settings
+
+class CachedResult(peewee.Model):
+    """One cached engine result: named arrays stored as a compressed .npz blob."""
+    key = peewee.CharField(primary_key=True)
+    symbol = peewee.CharField(index=True)
+    payload = peewee.BlobField()
+    size = peewee.IntegerField()
+    created_at = peewee.FloatField()
+    last_access = peewee.FloatField(index=True)
+
+    class Meta:
+        table_name = "result_cache"
+
+def make_cache_key(*parts, **options):
+    """Stable hash of the positional parts and keyword options."""
+    raw = json.dumps([[str(p) for p in parts], {k: str(v) for k, v in sorted(options.items())}])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def pack_arrays(arrays):
+    """Serialize {name: array} into a compressed .npz blob."""
+    buffer = BytesIO()
+    np.savez_compressed(buffer, **{name: np.asarray(value) for name, value in arrays.items()})
+    return buffer.getvalue()
+
+def unpack_arrays(payload):
+    """Inverse of `pack_arrays`."""
+    with np.load(BytesIO(payload), allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+class ResultCache:
+    """
+    Result cache shared by every process on the host through one SQLite file.
+
+    Entries are evicted least-recently-used first once the stored payloads
+    exceed `max_bytes`. Failures are logged and treated as misses so the
+    cache can never break a run.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.database = peewee.SqliteDatabase(path, pragmas={
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'busy_timeout': 5000,
+        })
+        # A model bound to this instance's database, so caches at different
+        # paths in one process never redirect each other's queries
+        self.model = type("CachedResult", (CachedResult,), {
+            "Meta": type("Meta", (), {"database": self.database, "table_name": CachedResult._meta.table_name}),
+            "__module__": __name__,
+        })
+        with self.database.connection_context():
+            self.database.create_tables([self.model], safe=True)
+
+    def get(self, key, max_age=None):
+        """Return the cached {name: array} for `key`, or None if missing or older than `max_age` seconds."""
+        try:
+            with self.database.connection_context():
+                row = self.model.get_or_none(self.model.key == key)
+                if row is None:
+                    return None
+                if max_age is not None and row.created_at < time.time() - max_age:
+                    return None
+                self.model.update(last_access=time.time()).where(self.model.key == key).execute()
+            return unpack_arrays(row.payload)
+        except (peewee.PeeweeException, OSError, ValueError) as e:
+            logging.warning(f"Result cache read failed: {e}")
+            return None
+
+    def put(self, key, symbol, arrays):
+        """Store {name: array} under `key` and evict old entries if over budget."""
+        payload = pack_arrays(arrays)
+        now = time.time()
+        try:
+            with self.database.connection_context():
+                self.model.replace(key=key, symbol=symbol, payload=payload, size=len(payload),
+                                     created_at=now, last_access=now).execute()
+                self._evict()
+        except (peewee.PeeweeException, OSError) as e:
+            logging.warning(f"Result cache write failed: {e}")
+
+    def _evict(self):
+        total = self.model.select(peewee.fn.COALESCE(peewee.fn.SUM(self.model.size), 0)).scalar()
+        if total <= self.max_bytes:
+            return
+        stale = []
+        query = self.model.select(self.model.key, self.model.size).order_by(self.model.last_access)
+        for row in query:
+            if total <= self.max_bytes:
+                break
+            stale.append(row.key)
+            total -= row.size
+        with self.database.atomic():
+            for start in range(0, len(stale), 500):
+                self.model.delete().where(self.model.key.in_(stale[start:start + 500])).execute()
+        logging.info(f"Result cache evicted {len(stale)} entries")
+
+    def clear(self):
+        with self.database.connection_context():
+            self.model.delete().execute()
+
+_cache_lock = threading.Lock()
+_cache = None
+_cache_unavailable = False
+
+def get_result_cache():
+    """
+    Return the process-wide cache, or None when STOCKS_RESULT_CACHE is empty
+    or the cache file cannot be opened (logged once; runs continue uncached).
+    """
+    global _cache, _cache_unavailable
+    if not settings.RESULT_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None and not _cache_unavailable:
+            try:
+                _cache = ResultCache(settings.RESULT_CACHE_PATH, settings.RESULT_CACHE_MAX_MB * 1024 * 1024)
+            except (peewee.PeeweeException, OSError) as e:
+                logging.warning(f"Result cache at {settings.RESULT_CACHE_PATH} unavailable, running without it: {e}")
+                _cache_unavailable = True
+        return _cache
@@ -0,0 +1,145 @@
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from datasource import create_provider, get_provider
+from pipeline import run_analysis
+from ui import default_request_dates
+import settings
+
+class PrefetchScheduler:
+    """
+    Warms the price and result caches for a configured universe before the
+    market opens.
+
+    For every symbol the price history behind `get_data_with_dates` is
+    refreshed and the fit and forecast for the default `create_ui` inputs
+    are precomputed into the shared result cache, so the first requests of
+    the day are cache hits. Upstream calls are spaced by at least
+    `min_interval` seconds (or spread evenly over `spread_minutes`) and
+    failures are retried with exponential backoff. A per-symbol status is
+    written to `status_path` after every symbol.
+    """
+
+    def __init__(self, symbols, min_interval=None, spread_minutes=None, retries=2,
+                 status_path=None, provider=None):
+        self.symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        self.min_interval = settings.PREFETCH_MIN_INTERVAL if min_interval is None else min_interval
+        self.spread_minutes = settings.PREFETCH_SPREAD_MINUTES if spread_minutes is None else spread_minutes
+        self.retries = retries
+        self.status_path = status_path or settings.PREFETCH_STATUS_PATH
+        self.provider = provider
+        self.status = {}
+        self._last_request = 0.0
+
+    def _interval(self):
+        if self.spread_minutes and self.symbols:
+            return max(self.min_interval, self.spread_minutes * 60 / len(self.symbols))
+        return self.min_interval
+
+    def _wait_turn(self, interval):
+        # Small jitter keeps replicas running the same schedule from aligning
+        delay = self._last_request + interval + random.uniform(0, 0.1 * interval) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last_request = time.monotonic()
+
+    def _write_status(self):
+        tmp_path = f"{self.status_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(self.status, handle, indent=2, default=str)
+        os.replace(tmp_path, self.status_path)
+
+    def _prefetch_symbol(self, symbol, start_date, end_date, forecast_end_date):
+        provider = self.provider or get_provider()
+        # Refresh the cached price history rather than serving yesterday's copy
+        if hasattr(provider, "refresh"):
+            data = provider.refresh(symbol, start_date, forecast_end_date)
+            # yfinance reports most failures as an empty frame; fail this attempt so it is
+            # retried with backoff instead of fetching again through run_analysis
+            if data is None or data.empty:
+                raise RuntimeError(f"Upstream returned no price data for {symbol}")
+        result = run_analysis(symbol, start_date, end_date, forecast_end_date, provider=provider, refresh=True)
+        if result is None:
+            return "insufficient_data", "Not enough data to fit"
+        return "ok", f"{len(result.fitting_prices)} fitting points, {len(result.S_forecast)} forecast points"
+
+    def run_once(self, today=None):
+        """Prefetch every symbol once for the default request of `today`."""
+        start_date, end_date, forecast_end_date = default_request_dates(today)
+        interval = self._interval()
+        logging.info(f"Prefetching {len(self.symbols)} symbols for {start_date} - {end_date} "
+                     f"(forecast to {forecast_end_date}), one every {interval:.1f}s")
+
+        for symbol in self.symbols:
+            entry = {'date': str(end_date), 'status': 'running', 'started_at': datetime.now().isoformat()}
+            self.status[symbol] = entry
+            backoff = interval
+            for attempt in range(self.retries + 1):
+                self._wait_turn(backoff)
+                started = time.perf_counter()
+                try:
+                    entry['status'], entry['message'] = self._prefetch_symbol(
+                        symbol, start_date, end_date, forecast_end_date
+                    )
+                    break
+                except ValueError as e:
+                    # Invalid symbol: retrying will not help
+                    entry['status'], entry['message'] = 'invalid', str(e)
+                    break
+                except Exception as e:
+                    logging.warning(f"Prefetch of {symbol} failed (attempt {attempt + 1}): {e}")
+                    entry['status'], entry['message'] = 'error', str(e)
+                    backoff = max(backoff, 1.0) * 2
+                finally:
+                    entry['attempts'] = attempt + 1
+                    entry['duration_seconds'] = round(time.perf_counter() - started, 3)
+            entry['finished_at'] = datetime.now().isoformat()
+            self._write_status()
+
+        completed = sum(1 for s in self.symbols if self.status[s]['status'] == 'ok')
+        logging.info(f"Prefetch finished: {completed}/{len(self.symbols)} symbols ready")
+        return self.status
+
+    def run_forever(self, at=None):
+        """Run `run_once` every day at local time `at` ("HH:MM")."""
+        hour, minute = map(int, (at or settings.PREFETCH_AT).split(":"))
+        while True:
+            now = datetime.now()
+            next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            logging.info(f"Next prefetch at {next_run}")
+            time.sleep((next_run - now).total_seconds())
+            self.run_once()
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch prices and precompute forecasts for a symbol universe.")
+    parser.add_argument("symbols", nargs="*", help="Symbols to warm (default: STOCKS_PREFETCH_SYMBOLS)")
+    parser.add_argument("--once", action="store_true", help="Run a single pass now and exit")
+    parser.add_argument("--at", default=settings.PREFETCH_AT, help="Daily local start time, HH:MM")
+    parser.add_argument("--min-interval", type=float, default=settings.PREFETCH_MIN_INTERVAL,
+                        help="Minimum seconds between symbols")
+    parser.add_argument("--spread-minutes", type=float, default=settings.PREFETCH_SPREAD_MINUTES,
+                        help="Spread the universe evenly over this many minutes")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s | %(levelname)s | %(filename)s:%(lineno)d | %(message)s")
+    symbols = args.symbols or settings.PREFETCH_SYMBOLS
+    if not symbols:
+        parser.error("No symbols given and STOCKS_PREFETCH_SYMBOLS is empty.")
+
+    # Always write through the price cache, even for symbols given on the command line
+    scheduler = PrefetchScheduler(symbols, min_interval=args.min_interval, spread_minutes=args.spread_minutes,
+                                  provider=create_provider(price_cache=True))
+    if args.once:
+        scheduler.run_once()
+    else:
+        scheduler.run_forever(args.at)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+
+def _env_int(name, default):
+    """Read an integer setting from the environment."""
+    value = os.environ.get(name, "").strip()
+    try:
+        return int(value) if value else default
+    except ValueError:
+        return default
+
+def _env_float(name, default):
+    """Read a float setting from the environment."""
+    value = os.environ.get(name, "").strip()
+    try:
+        return float(value) if value else default
+    except ValueError:
+        return default
+
+def _env_flag(name, default=False):
+    """Read a boolean setting from the environment."""
+    value = os.environ.get(name, "").strip().lower()
+    if not value:
+        return default
+    return value in ("1", "true", "yes", "on")
+
+# Root log level. Per-step engine diagnostics go to the step tracer rather
+# than the log.
+LOG_LEVEL = os.environ.get("STOCKS_LOG_LEVEL", "INFO").upper()
+
+# Step tracer (tracer.py). When enabled each run records alpha, beta, h,
+# branch and guard hits for every `TRACE_SAMPLE_EVERY`-th step, keeping the
+# most recent `TRACE_CAPACITY` records.
+TRACE_STEPS = _env_flag("STOCKS_TRACE_STEPS")
+TRACE_SAMPLE_EVERY = _env_int("STOCKS_TRACE_SAMPLE_EVERY", 1)
+TRACE_CAPACITY = _env_int("STOCKS_TRACE_CAPACITY", 4096)
+
+# Residual analytics (analytics.py): rolling RMSE/MAE/MAPE window sizes in bars.
+ANALYTICS_WINDOWS = [int(w) for w in os.environ.get("STOCKS_ANALYTICS_WINDOWS", "5,20").split(",")
+                     if w.strip().isdigit() and int(w) > 0]
+
+# Metrics exporter. A port of 0 and an empty file path disable the exporter.
+# The file path may contain "{pid}" so each replica writes its own file.
+METRICS_PORT = _env_int("STOCKS_METRICS_PORT", 0)
+METRICS_FILE = os.environ.get("STOCKS_METRICS_FILE", "")
+METRICS_FILE_INTERVAL = _env_float("STOCKS_METRICS_FILE_INTERVAL", 15.0)
+SESSION_TTL_SECONDS = _env_float("STOCKS_SESSION_TTL_SECONDS", 1800.0)
+
+# Market data source: "yahoo", "local" (bulk Parquet/CSV archive at
+# STOCKS_DATA_PATH) or "replay" (recorded responses in STOCKS_REPLAY_DIR).
+DATA_SOURCE = os.environ.get("STOCKS_DATA_SOURCE", "yahoo")
+DATA_PATH = os.environ.get("STOCKS_DATA_PATH", "")
+REPLAY_DIR = os.environ.get("STOCKS_REPLAY_DIR", "recordings")
+REPLAY_RECORD = _env_flag("STOCKS_REPLAY_RECORD")
+
+# Excel export. Workbooks are built when the download is requested and cached
+# by content hash; with STOCKS_EXCEL_PREBUILD they are also built in the
+# background as soon as a run finishes.
+EXCEL_CACHE_SIZE = _env_int("STOCKS_EXCEL_CACHE_SIZE", 16)
+EXCEL_PREBUILD = _env_flag("STOCKS_EXCEL_PREBUILD")
+EXPORT_WORKERS = _env_int("STOCKS_EXPORT_WORKERS", 2)
+BUNDLE_WORKERS = _env_int("STOCKS_BUNDLE_WORKERS", os.cpu_count() or 2)
+
+# Interactive charts send at most this many points per chart (about one per
+# horizontal pixel); zooming re-slices the full arrays on the server.
+CHART_MAX_POINTS = _env_int("STOCKS_CHART_MAX_POINTS", 1200)
+
+# Static charts are rendered from cached figure templates at this DPI, or at
+# the preview DPI when the low-resolution preview is selected.
+CHART_DPI = _env_int("STOCKS_CHART_DPI", 150)
+CHART_PREVIEW_DPI = _env_int("STOCKS_CHART_PREVIEW_DPI", 72)
+
+# Memory-budgeted runs keep only the columns the engine uses, split and filter
+# with views instead of copies, and release raw frames once consumed.
+MEMORY_BUDGET = _env_flag("STOCKS_MEMORY_BUDGET")
+
+# Shared result cache (SQLite file readable by every process on the host).
+# An empty path disables it.
+RESULT_CACHE_PATH = os.environ.get("STOCKS_RESULT_CACHE", "stocks_cache.sqlite3")
+RESULT_CACHE_MAX_MB = _env_int("STOCKS_RESULT_CACHE_MAX_MB", 256)
+
+# Yahoo price history is cached in the shared result cache for this long, so
+# data refreshed by the prefetch scheduler is served to every app process.
+# Only used when STOCKS_PREFETCH_SYMBOLS is set (and by the scheduler itself).
+PRICE_CACHE_TTL_SECONDS = _env_float("STOCKS_PRICE_CACHE_TTL_SECONDS", 12 * 3600.0)
+
+# Pre-market prefetch scheduler (scheduler.py).
+PREFETCH_SYMBOLS = [s.strip().upper() for s in os.environ.get("STOCKS_PREFETCH_SYMBOLS", "").split(",") if s.strip()]
+PREFETCH_AT = os.environ.get("STOCKS_PREFETCH_AT", "07:30")
+PREFETCH_MIN_INTERVAL = _env_float("STOCKS_PREFETCH_MIN_INTERVAL", 2.0)
+PREFETCH_SPREAD_MINUTES = _env_float("STOCKS_PREFETCH_SPREAD_MINUTES", 0.0)
+PREFETCH_STATUS_PATH = os.environ.get("STOCKS_PREFETCH_STATUS", "prefetch_status.json")
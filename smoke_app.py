@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import tempfile
+
+def _problems(at):
+    """Exceptions and error messages shown on the page."""
+    return [e.value for e in at.exception] + [e.value for e in at.error]
+
+def _download_labels(at):
+    return [element.proto.label for element in at.get("download_button")]
+
+def run_smoke(data_path, symbols, timeout):
+    """
+    Run the app headless against a local archive and return a list of failures.
+
+    Covers the single-symbol analysis and the watchlist bundle, each as far
+    as its download button.
+    """
+    # Settings are read at import time, so configure them before the app loads
+    cache_dir = tempfile.mkdtemp(prefix="stocks_smoke_")
+    os.environ.update({
+        "STOCKS_DATA_SOURCE": "local",
+        "STOCKS_DATA_PATH": data_path,
+        "STOCKS_RESULT_CACHE": os.path.join(cache_dir, "cache.sqlite3"),
+        "STOCKS_PREFETCH_STATUS": os.path.join(cache_dir, "prefetch_status.json"),
+    })
+    from streamlit.testing.v1 import AppTest
+
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    at.run()
+    failures = [f"startup: {p}" for p in _problems(at)]
+
+    at.text_input[0].set_value(symbols[0])
+    next(b for b in at.button if "Submit" in b.label).click().run()
+    failures += [f"analysis: {p}" for p in _problems(at)]
+    if not at.metric:
+        failures.append("analysis: no metrics shown")
+
+    at.text_area(key="bundle_symbols").set_value(", ".join(symbols))
+    next(b for b in at.button if "Report Bundle" in b.label).click().run()
+    failures += [f"bundle: {p}" for p in _problems(at)]
+    if "📥 Download Report Bundle" not in _download_labels(at):
+        failures.append("bundle: no download button")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless smoke run of the Streamlit app.")
+    parser.add_argument("--data-path", required=True,
+                        help="Local archive (directory of <symbol>.csv/.parquet or one combined file)")
+    parser.add_argument("--symbols", default="BBCA.JK,BBRI.JK", help="Comma separated; the first is analysed")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds allowed per script run")
+    args = parser.parse_args(argv)
+
+    symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    failures = run_smoke(args.data_path, symbols, args.timeout)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+    print("OK: analysis and report bundle reached their download buttons")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
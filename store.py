@@ -1,45 +1,69 @@
+import hashlib
+import numpy as np
 import pandas as pd
-import yfinance as yf
 import logging
+from dataclasses import dataclass
+from datasource import get_provider
 
-def validate_stock_symbol(stock_name):
+# Bar resolutions: pandas period frequency per resolution (None keeps daily bars)
+RESOLUTIONS = {'daily': None, 'weekly': 'W-FRI', 'monthly': 'M'}
+
+# How each OHLCV column is aggregated into a bar
+OHLCV_AGGREGATION = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last',
+                     'Adj Close': 'last', 'Volume': 'sum'}
+
+def validate_stock_symbol(stock_name, provider=None):
     """Validate if the stock symbol exists."""
-    try:
-        ticker = yf.Ticker(stock_name)
-        # Fetch minimal data to check if symbol is valid
-        info = ticker.info
-        return True
-    except Exception as e:
-        logging.error(f"Invalid stock symbol {stock_name}: {e}")
-        return False
+    provider = provider or get_provider()
+    return provider.validate_symbol(stock_name)
 
-def get_data_with_dates(stock_name, start_date, end_date, forecast_end_date):
+def get_data_with_dates(stock_name, start_date, end_date, forecast_end_date, provider=None, columns=None,
+                        resolution='daily'):
     """
-    Get stock data with proper date alignment for both fitting and forecasting
+    Get stock data with proper date alignment for both fitting and forecasting.
+    `columns` restricts the returned frames to those columns. With a
+    `resolution` other than 'daily' both frames are aggregated into bars by
+    `resample_ohlcv` after the split, so no bar mixes fitting and forecast
+    days. The split and the forecast end are then moved back to the start of
+    the bar containing them, so the forecast is a whole number of bars
+    rather than gaining partial bars at either end.
     """
+    provider = provider or get_provider()
     try:
         # Validate stock symbol first
-        if not validate_stock_symbol(stock_name):
+        if not validate_stock_symbol(stock_name, provider):
             raise ValueError(f"Invalid stock symbol: {stock_name}")
 
         # Download all data from start_date to forecast_end_date
-        all_data = yf.download(stock_name, start=start_date, end=forecast_end_date, auto_adjust=False)
+        all_data = provider.history(stock_name, start_date, forecast_end_date)
         
         if all_data.empty:
             logging.error(f"No data available for {stock_name}")
             return None, None
         
-        # Handle multi-ticker data
-        if isinstance(all_data.columns, pd.MultiIndex):
-            logging.warning(f"Multi-ticker data detected for {stock_name}. Selecting first ticker.")
-            all_data = all_data.xs(stock_name, axis=1, level=1, drop_level=True)
+        if columns is not None:
+            all_data = all_data[[c for c in columns if c in all_data.columns]]
+        if not all_data.index.is_monotonic_increasing:
+            all_data = all_data.sort_index()
         
-        # Split into fitting and forecast data
-        fitting_data = all_data[all_data.index < pd.Timestamp(end_date)]
-        forecast_data = all_data[all_data.index >= pd.Timestamp(end_date)]
+        # Split into fitting and forecast data as slices of the sorted frame
+        split_date, stop_date = pd.Timestamp(end_date), pd.Timestamp(forecast_end_date)
+        if RESOLUTIONS[resolution] is not None:
+            split_date, stop_date = bar_start(split_date, resolution), bar_start(stop_date, resolution)
+        split = all_data.index.searchsorted(split_date, side='left')
+        stop = all_data.index.searchsorted(stop_date, side='left')
+        fitting_data = all_data.iloc[:split]
+        forecast_data = all_data.iloc[split:max(stop, split)]
+        if RESOLUTIONS[resolution] is not None:
+            fitting_data = resample_ohlcv(fitting_data, resolution)
+            forecast_data = resample_ohlcv(forecast_data, resolution)
+            if fitting_data.empty:
+                logging.error(f"No {resolution} bars available for {stock_name}")
+                return None, None
         
         logging.info(f"Fitting data: {len(fitting_data)} points from {fitting_data.index[0]} to {fitting_data.index[-1]}")
-        logging.info(f"Forecast data: {len(forecast_data)} points from {forecast_data.index[0]} to {forecast_data.index[-1]}")
+        if not forecast_data.empty:
+            logging.info(f"Forecast data: {len(forecast_data)} points from {forecast_data.index[0]} to {forecast_data.index[-1]}")
         
         return fitting_data, forecast_data
         
@@ -50,9 +74,104 @@ def get_data_with_dates(stock_name, start_date, end_date, forecast_end_date):
         logging.error(f"Error getting data for {stock_name}: {e}")
         return None, None
     
-def get_data(stock_name, start_date, end_date):
+def bar_start(date, resolution):
+    """Start of the `resolution` bar containing `date`, as a Timestamp."""
+    return pd.Timestamp(date).to_period(RESOLUTIONS[resolution]).start_time
+
+def resample_ohlcv(data_df, resolution):
+    """
+    Aggregate a daily OHLCV frame into weekly or monthly bars.
+
+    Each bar is labelled with the date of its last trading day, so bar
+    dates are real trading dates and never lie past the input. Columns
+    outside `OHLCV_AGGREGATION` are dropped.
+    """
+    freq = RESOLUTIONS[resolution]
+    if freq is None or data_df is None or data_df.empty:
+        return data_df
+    index = data_df.index
+    periods = (index.tz_localize(None) if index.tz is not None else index).to_period(freq)
+    # The index is sorted, so each bar ends where the period changes
+    ends = np.append(np.flatnonzero(periods[1:] != periods[:-1]), len(periods) - 1)
+    aggregation = {c: OHLCV_AGGREGATION[c] for c in data_df.columns if c in OHLCV_AGGREGATION}
+    bars = data_df.groupby(periods, sort=False).agg(aggregation)
+    bars.index = index[ends]
+    return bars
+
+@dataclass(frozen=True)
+class IngestedData:
+    """
+    Output of `ingest_data`.
+
+    `fitting_data` and `forecast_data` are the raw frames (for display);
+    `fitting_prices` and `fitting_dates` are the deduplicated engine inputs,
+    which are views of the frame when nothing was dropped.
+    """
+    fitting_data: pd.DataFrame
+    forecast_data: pd.DataFrame
+    fitting_prices: np.ndarray
+    fitting_dates: pd.DatetimeIndex
+
+    @property
+    def duplicates_removed(self):
+        return len(self.fitting_data) - len(self.fitting_prices)
+
+    @property
+    def fingerprint(self):
+        """
+        Hash of the engine inputs and the forecast-period prices, so cached
+        results are not reused once new bars arrive for the same range.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(np.ascontiguousarray(self.fitting_prices, dtype=float).tobytes())
+        digest.update(self.fitting_dates.asi8.tobytes())
+        if self.forecast_data is not None and not self.forecast_data.empty:
+            digest.update(np.ascontiguousarray(self.forecast_data['Close'].to_numpy(), dtype=float).tobytes())
+            digest.update(pd.DatetimeIndex(self.forecast_data.index).asi8.tobytes())
+        return digest.hexdigest()
+
+def consecutive_duplicate_mask(values):
+    """True for every value that differs from the one before it; the first value is always kept."""
+    keep = np.empty(len(values), dtype=bool)
+    if len(values):
+        keep[0] = True
+        np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return keep
+
+def ingest_data(stock_name, start_date, end_date, forecast_end_date, provider=None, columns=None,
+                resolution='daily'):
+    """
+    Fetch, split and deduplicate in one stage.
+
+    The sorted history is split with one `searchsorted` (see
+    `get_data_with_dates`) and the consecutive-duplicate mask is computed
+    directly on the fitting `Close` array, without copying the frame.
+    Returns an `IngestedData`, or None when no data is available; callers
+    check the minimum number of points on the deduplicated prices.
+    """
+    fitting_data, forecast_data = get_data_with_dates(
+        stock_name, start_date, end_date, forecast_end_date, provider=provider, columns=columns,
+        resolution=resolution
+    )
+    if fitting_data is None or fitting_data.empty:
+        return None
+    close = fitting_data['Close']
+    if isinstance(close, pd.DataFrame):
+        logging.error(f"Unexpected: 'Close' column is a DataFrame: {close.head()}")
+        return None
+    prices = close.to_numpy()
+    keep = consecutive_duplicate_mask(prices)
+    dates = fitting_data.index
+    if not keep.all():
+        prices = prices[keep]
+        dates = dates[keep]
+    logging.info(f"Filtered data: {len(prices)} points after removing {len(keep) - len(prices)} duplicates")
+    return IngestedData(fitting_data, forecast_data, prices, dates)
+
+def get_data(stock_name, start_date, end_date, provider=None):
     """Legacy function for backward compatibility"""
-    data = yf.download(stock_name, start=start_date, end=end_date, auto_adjust=False)
+    provider = provider or get_provider()
+    data = provider.history(stock_name, start_date, end_date)
     if data.empty:
         return []
     closing_prices = data['Close']
@@ -67,14 +186,13 @@ def filter_prices_duplicates(data_df):
         return pd.DataFrame()
     
     # Remove consecutive duplicate closing prices
-    filtered_data = data_df.copy()
-    if isinstance(filtered_data['Close'], pd.DataFrame):
-        logging.error(f"Unexpected: 'Close' column is a DataFrame: {filtered_data['Close'].head()}")
+    if isinstance(data_df['Close'], pd.DataFrame):
+        logging.error(f"Unexpected: 'Close' column is a DataFrame: {data_df['Close'].head()}")
         return pd.DataFrame()
-    mask = filtered_data['Close'].diff() != 0
-    mask.iloc[0] = True  # Always keep first value
+    mask = consecutive_duplicate_mask(data_df['Close'].to_numpy())
     
-    filtered_data = filtered_data[mask]
+    # The input is never modified, so keep it as-is when nothing is dropped
+    filtered_data = data_df if mask.all() else data_df[mask]
     
     logging.info(f"Filtered data: {len(filtered_data)} points after removing {len(data_df) - len(filtered_data)} duplicates")
     
@@ -1,5 +1,7 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
+import settings
 
 def display_fitting_table(stock_symbol, fitting_dates, closing_prices, Fitting_S_n_list):
     """
@@ -93,6 +95,24 @@ def display_mape_table(stock_symbol, mape_data, period_type):
         }
     )
 
+def _raw_display_frame(fitting_data, forecast_data):
+    """
+    The raw data table built column by column from both frames, with no
+    combined frame or `reset_index` copy in between.
+    """
+    frames = [fitting_data]
+    if forecast_data is not None and not forecast_data.empty:
+        frames.append(forecast_data)
+    dates = frames[0].index.append([frame.index for frame in frames[1:]])
+    # Fitting and forecast are consecutive slices of one sorted frame, so this rarely reorders
+    order = None if dates.is_monotonic_increasing else np.argsort(dates.asi8, kind='stable')
+    columns = {'Date': dates.strftime('%Y-%m-%d')}
+    for column in fitting_data.columns:
+        columns[column] = np.concatenate([frame[column].to_numpy() for frame in frames])
+    if order is not None:
+        columns = {name: np.asarray(values)[order] for name, values in columns.items()}
+    return pd.DataFrame(columns)
+
 def display_raw_data_table(stock_symbol, fitting_data, forecast_data, start_date, end_date, forecast_end_date):
     """
     Display a table for the raw Yahoo Finance data for the specified stock symbol and date range.
@@ -100,18 +120,22 @@ def display_raw_data_table(stock_symbol, fitting_data, forecast_data, start_date
     st.subheader(f"📋 Raw Data from Yahoo Finance ({stock_symbol})")
     st.markdown(f"Data retrieved for the period: {start_date.strftime('%d/%m/%Y')} to {forecast_end_date.strftime('%d/%m/%Y')}")
     
-    # Combine fitting and forecast data
-    if forecast_data is not None and not forecast_data.empty:
-        combined_data = pd.concat([fitting_data, forecast_data])
+    if settings.MEMORY_BUDGET:
+        raw_data_display = _raw_display_frame(fitting_data, forecast_data)
     else:
-        combined_data = fitting_data
-    
-    # Ensure the data is sorted by date
-    combined_data = combined_data.sort_index()
-    
-    # Reset index to make 'Date' a column and format it as string
-    raw_data_display = combined_data.reset_index()
-    raw_data_display['Date'] = raw_data_display['Date'].dt.strftime('%Y-%m-%d')
+        # Combine fitting and forecast data
+        if forecast_data is not None and not forecast_data.empty:
+            combined_data = pd.concat([fitting_data, forecast_data])
+        else:
+            combined_data = fitting_data
+        
+        # Ensure the data is sorted by date
+        if not combined_data.index.is_monotonic_increasing:
+            combined_data = combined_data.sort_index()
+        
+        # Reset index to make 'Date' a column and format it as string
+        raw_data_display = combined_data.reset_index()
+        raw_data_display['Date'] = raw_data_display['Date'].dt.strftime('%Y-%m-%d')
     
     # Rename columns to include stock symbol
     raw_data_display = raw_data_display.rename(columns={
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# Guard bits recorded per step
+GUARD_V = 1          # a velocity was clamped to 1e-12
+GUARD_ALPHA = 2      # alpha was clamped to 1e-12
+GUARD_BETA = 4       # beta was clamped to 1e-12
+GUARD_FALLBACK = 8   # the step raised and kept the previous value
+
+GUARD_NAMES = {GUARD_V: 'v_clamped', GUARD_ALPHA: 'alpha_clamped',
+               GUARD_BETA: 'beta_clamped', GUARD_FALLBACK: 'fallback'}
+
+PHASE_FIT = 0
+PHASE_FORECAST = 1
+
+TRACE_DTYPE = np.dtype([
+    ('phase', np.int8),
+    ('step', np.int32),
+    ('alpha', np.float64),
+    ('beta', np.float64),
+    ('h', np.float64),
+    ('condition_1', np.float64),
+    ('branch', np.int8),
+    ('guards', np.uint8),
+    ('s_n', np.float64),
+])
+
+def guard_flags(v_0, v_2, alpha, beta, fallback=False):
+    """Guard bitmask for one step of the recurrence."""
+    flags = 0
+    if abs(v_0) <= 1e-12 or abs(v_2) <= 1e-12:
+        flags |= GUARD_V
+    if abs(alpha) <= 1e-12:
+        flags |= GUARD_ALPHA
+    if abs(beta) <= 1e-12:
+        flags |= GUARD_BETA
+    if fallback:
+        flags |= GUARD_FALLBACK
+    return flags
+
+class StepTracer:
+    """
+    Records per-step diagnostics of `fitting` and `forecasting` into a
+    preallocated structured array.
+
+    Every `sample_every`-th step is kept. Once `capacity` records are
+    stored the buffer wraps and keeps the most recent ones. Pass an instance
+    as `tracer=` to enable tracing; with the default `tracer=None` the
+    engine loops skip it entirely.
+    """
+
+    def __init__(self, capacity=4096, sample_every=1):
+        self.capacity = max(int(capacity), 1)
+        self.sample_every = max(int(sample_every), 1)
+        self._buffer = np.zeros(self.capacity, dtype=TRACE_DTYPE)
+        self._count = 0
+
+    def record(self, phase, step, alpha, beta, h, condition_1, branch, guards, s_n):
+        if step % self.sample_every:
+            return
+        self._buffer[self._count % self.capacity] = (phase, step, alpha, beta, h, condition_1, branch, guards, s_n)
+        self._count += 1
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def dropped(self):
+        """Number of sampled records overwritten after the buffer wrapped."""
+        return max(self._count - self.capacity, 0)
+
+    def records(self):
+        """Recorded steps in order, oldest first."""
+        if self._count <= self.capacity:
+            return self._buffer[:self._count].copy()
+        start = self._count % self.capacity
+        return np.concatenate([self._buffer[start:], self._buffer[:start]])
+
+    def to_frame(self):
+        frame = pd.DataFrame(self.records())
+        frame['phase'] = frame['phase'].map({PHASE_FIT: 'fit', PHASE_FORECAST: 'forecast'})
+        return frame
+
+    def branch_counts(self, phase=None):
+        """{branch index: count}; -1 counts steps where condition_1 was zero."""
+        records = self.records()
+        if phase is not None:
+            records = records[records['phase'] == phase]
+        branches, counts = np.unique(records['branch'], return_counts=True)
+        return dict(zip(branches.tolist(), counts.tolist()))
+
+    def guard_rates(self, phase=None):
+        """{guard name: fraction of recorded steps that hit it}."""
+        records = self.records()
+        if phase is not None:
+            records = records[records['phase'] == phase]
+        if not len(records):
+            return {name: 0.0 for name in GUARD_NAMES.values()}
+        return {name: float(np.mean(records['guards'] & bit != 0)) for bit, name in GUARD_NAMES.items()}
+
+    def summary(self):
+        return {
+            'records': len(self),
+            'dropped': self.dropped,
+            'sample_every': self.sample_every,
+            'branch_counts': self.branch_counts(),
+            'guard_rates': self.guard_rates(),
+        }
@@ -1,6 +1,37 @@
 import streamlit as st
+import pandas as pd
 from datetime import datetime, timedelta
 
+DEFAULT_STOCK_SYMBOL = "BBCA.JK"
+DEFAULT_TRAINING_DAYS = 120
+DEFAULT_FORECAST_DAYS = 60
+
+# Bar resolutions offered for the fit and forecast: (option label, unit header, unit text)
+RESOLUTION_OPTIONS = {
+    'daily': ("Harian", "Day", "hari"),
+    'weekly': ("Mingguan", "Week", "minggu"),
+    'monthly': ("Bulanan", "Month", "bulan"),
+}
+DAYS_PER_BAR = {'daily': 1, 'weekly': 7, 'monthly': 30}
+
+def bar_unit(resolution):
+    """Unit text ("hari", "minggu", "bulan") of one bar at `resolution`."""
+    return RESOLUTION_OPTIONS[resolution][2]
+
+def add_bars(date, bars, resolution):
+    """`date` moved forward by `bars` bars of `resolution`."""
+    if resolution == 'monthly':
+        return (pd.Timestamp(date) + pd.DateOffset(months=bars)).date()
+    return date + timedelta(days=bars * DAYS_PER_BAR[resolution])
+
+def default_request_dates(today=None):
+    """Start, end and forecast end dates of the default `create_ui` inputs."""
+    today = today or datetime.today().date()
+    max_fitting_date = today - timedelta(days=2)
+    start_date = today - timedelta(days=DEFAULT_TRAINING_DAYS)
+    end_date = min(start_date + timedelta(days=DEFAULT_TRAINING_DAYS), max_fitting_date)
+    return start_date, end_date, end_date + timedelta(days=DEFAULT_FORECAST_DAYS)
+
 def create_ui():
     st.title("📈 Stock Price Fitting and Forecasting Web")
     st.markdown("---")
@@ -18,14 +49,13 @@ def create_ui():
     col1, col2, col3, col4 = st.columns(4)
     
     # Default values
-    default_stock_symbol = "BBCA.JK"
+    default_stock_symbol = DEFAULT_STOCK_SYMBOL
     today = datetime.today().date()
     max_fitting_date = today - timedelta(days=2)
-    default_start_date = today - timedelta(days=120)  
-    default_training_days = 120  
-    default_forecast_days = 60
-    default_custom_end_date = max_fitting_date
-    default_forecast_end_date = max_fitting_date + timedelta(days=default_forecast_days)
+    # Shared with the prefetch scheduler, so its warmed cache keys match the default request
+    default_start_date, default_custom_end_date, default_forecast_end_date = default_request_dates(today)
+    default_training_days = (default_custom_end_date - default_start_date).days
+    default_forecast_days = (default_forecast_end_date - default_custom_end_date).days
     
     # Clear All function
     def clear_all():
@@ -38,8 +68,24 @@ def create_ui():
         st.session_state.custom_end = default_custom_end_date
         st.session_state.use_custom_forecast_end = False
         st.session_state.custom_forecast_end = default_forecast_end_date
+        st.session_state.use_ensemble = False
+        st.session_state.interactive_charts = False
+        st.session_state.chart_preview = False
+        st.session_state.resolution = 'daily'
+        st.session_state.last_resolution = 'daily'
         st.session_state.last_start_date = default_start_date
     
+    # Keep the forecast horizon roughly the same length when the bar size changes
+    def convert_forecast_period():
+        previous = st.session_state.get('last_resolution', 'daily')
+        current = st.session_state.resolution
+        days = st.session_state.get('forecast_days', default_forecast_days) * DAYS_PER_BAR[previous]
+        st.session_state.forecast_days = max(1, round(days / DAYS_PER_BAR[current]))
+        st.session_state.last_resolution = current
+    
+    resolution = st.session_state.get('resolution', 'daily')
+    _, unit_header, unit_text = RESOLUTION_OPTIONS[resolution]
+    
     # Use default values if reset is triggered
     if st.session_state.reset_inputs:
         stock_symbol_value = default_stock_symbol
@@ -104,7 +150,7 @@ def create_ui():
         )
     
     with col4:
-        st.markdown("**Forecast Period (Day)**")
+        st.markdown(f"**Forecast Period ({unit_header})**")
         forecast_days = st.number_input(
             "", 
             min_value=1, 
@@ -112,7 +158,7 @@ def create_ui():
             step=1, 
             key="forecast_days", 
             label_visibility="collapsed",
-            help="Masukkan jumlah hari untuk periode forecast."
+            help=f"Masukkan jumlah {unit_text} untuk periode forecast."
         )
     
     # Clear All Button 
@@ -124,8 +170,8 @@ def create_ui():
         end_date = max_fitting_date
         training_days = max(1, (end_date - start_date).days)
     
-    # Calculate forecast_end_date
-    forecast_end_date = end_date + timedelta(days=forecast_days)
+    # Calculate forecast_end_date; the forecast period is counted in bars
+    forecast_end_date = add_bars(end_date, forecast_days, resolution)
     
     # Advanced Options (Collapsible)
     with st.expander("⚙️ Advanced Options"):
@@ -160,7 +206,47 @@ def create_ui():
                     help="Pilih tanggal akhir untuk periode forecast."
                 )
                 forecast_end_date = custom_forecast_end
-                forecast_days = max(1, (forecast_end_date - end_date).days)
+                forecast_days = max(1, (forecast_end_date - end_date).days // DAYS_PER_BAR[resolution])
+        
+        st.selectbox(
+            "Resolusi Data",
+            options=list(RESOLUTION_OPTIONS),
+            format_func=lambda option: RESOLUTION_OPTIONS[option][0],
+            key="resolution",
+            on_change=convert_forecast_period,
+            help="Agregasi data harian menjadi bar mingguan atau bulanan sebelum fitting, "
+                 "untuk riwayat panjang (puluhan tahun). Periode forecast dihitung dalam bar."
+        )
+        
+        interactive_charts = st.checkbox(
+            "Grafik Interaktif",
+            value=st.session_state.get('interactive_charts', False),
+            key="interactive_charts",
+            help="Grafik Altair dengan zoom: pilih rentang pada grafik ringkasan untuk melihat "
+                 "data pada rentang tersebut dengan resolusi penuh."
+        )
+        
+        chart_preview = st.checkbox(
+            "Pratinjau Grafik (DPI Rendah)",
+            value=st.session_state.get('chart_preview', False),
+            key="chart_preview",
+            disabled=interactive_charts,
+            help="Render grafik statis dengan resolusi lebih rendah agar lebih cepat tampil."
+        )
+        
+        use_ensemble = st.checkbox("Monte Carlo Ensemble", value=st.session_state.get('use_ensemble', False),
+                                   key="use_ensemble",
+                                   help="Tampilkan pita ketidakpastian forecast dari banyak jalur simulasi.")
+        ensemble_paths = 0
+        if use_ensemble:
+            ensemble_paths = st.number_input(
+                "Jumlah Jalur Simulasi",
+                min_value=100,
+                max_value=10000,
+                value=st.session_state.get('ensemble_paths', 1000),
+                step=100,
+                key="ensemble_paths"
+            )
     
     # Reset the reset_inputs flag after applying values
     if st.session_state.reset_inputs:
@@ -180,7 +266,7 @@ def create_ui():
         st.markdown(f"""
         **🔮 Data Forecast Period Details:**
         - **Periode Forecast:** {end_date.strftime('%d/%m/%Y')} - {forecast_end_date.strftime('%d/%m/%Y')}
-        - **Durasi Forecast:** {forecast_days} hari
+        - **Durasi Forecast:** {forecast_days} {unit_text}
         """)
     
     # Warning for short fitting periods
@@ -189,4 +275,19 @@ def create_ui():
     
     st.markdown("---")
     
-    return stock_symbol, start_date, training_days, forecast_days, end_date, forecast_end_date
\ No newline at end of file
+    return (stock_symbol, start_date, training_days, forecast_days, end_date, forecast_end_date, ensemble_paths,
+            resolution, interactive_charts, chart_preview)
+
+def create_bundle_ui():
+    """Inputs for the multi-symbol watchlist report bundle."""
+    with st.expander("📦 Watchlist Report Bundle"):
+        st.markdown("Buat satu laporan Excel per simbol (dengan periode di atas) dalam satu file ZIP.")
+        symbols_text = st.text_area(
+            "Daftar Simbol",
+            value=st.session_state.get('bundle_symbols', "BBCA.JK, BBRI.JK, BMRI.JK, TLKM.JK"),
+            key="bundle_symbols",
+            help="Pisahkan simbol dengan koma, spasi, atau baris baru."
+        )
+        run_bundle = st.button("📦 Buat Report Bundle", use_container_width=True)
+    symbols = [s.strip().upper() for s in symbols_text.replace(",", " ").split() if s.strip()]
+    return symbols, run_bundle